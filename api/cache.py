@@ -0,0 +1,129 @@
+"""Kado v0 — Result cache for repeated uploads.
+
+Analysis results are keyed by a hash of the uploaded video (plus the
+pipeline settings that affect the result) and kept in a small LFU cache.
+Entries are mirrored as JSON files so a worker restart doesn't lose them.
+The directory usually sits in a world-writable tmpfs, so it must be private
+to this user, and entries read back from it are validated before use.
+"""
+
+import json
+import logging
+import os
+import stat
+from pathlib import Path
+from typing import Callable, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class ResultCache:
+    """Least-frequently-used cache of /analyze responses, backed by a directory."""
+
+    def __init__(
+        self,
+        max_size: int,
+        directory: Optional[str] = None,
+        validate: Optional[Callable[[dict], dict]] = None,
+    ):
+        """Set up the cache, creating or checking its directory.
+
+        Args:
+            max_size: Max entries kept (0 disables the cache).
+            directory: Where entries are mirrored; None keeps them in memory only.
+            validate: Checks an entry read back from disk and returns the value
+                to serve. Raising ValueError turns the entry into a miss.
+        """
+        self.max_size = max_size
+        self.directory = Path(directory) if directory else None
+        self.validate = validate
+        self._entries: dict[str, dict] = {}
+        self._hits: dict[str, int] = {}
+        if self.directory and max_size > 0:
+            if self._make_private_directory():
+                self._prune_directory()
+            else:
+                self.directory = None
+
+    def _make_private_directory(self) -> bool:
+        """Create the directory as 0700, or check an existing one is ours alone.
+
+        Another local user could have created it first in a shared tmpfs and
+        planted entries in it, so a directory owned by anyone else is refused.
+        """
+        try:
+            self.directory.mkdir(mode=0o700, parents=True, exist_ok=True)
+            st = os.lstat(self.directory)
+            if not stat.S_ISDIR(st.st_mode) or st.st_uid != os.getuid():
+                logger.warning("Result cache dir %s is not owned by this user — memory only", self.directory)
+                return False
+            if stat.S_IMODE(st.st_mode) != 0o700:
+                os.chmod(self.directory, 0o700)
+        except OSError:
+            logger.warning("Result cache dir %s is not writable — memory only", self.directory)
+            return False
+        return True
+
+    def _prune_directory(self) -> None:
+        """Drop all but the newest max_size entries left by earlier workers."""
+        try:
+            files = sorted(self.directory.glob("*.json"), key=lambda p: p.stat().st_mtime, reverse=True)
+        except OSError:
+            return
+        for path in files[self.max_size:]:
+            try:
+                os.unlink(path)
+            except OSError:
+                pass
+
+    def _path(self, key: str) -> Optional[Path]:
+        return self.directory / f"{key}.json" if self.directory else None
+
+    def get(self, key: str) -> Optional[dict]:
+        """Return the cached response for key, or None."""
+        if self.max_size <= 0:
+            return None
+
+        value = self._entries.get(key)
+        if value is None:
+            path = self._path(key)
+            if path is None:
+                return None
+            try:
+                value = json.loads(path.read_text())
+                if self.validate is not None:
+                    value = self.validate(value)
+            except (OSError, ValueError):
+                return None
+            self._store(key, value)
+
+        self._hits[key] += 1
+        return value
+
+    def put(self, key: str, value: dict) -> None:
+        """Cache a response, evicting the least-used entry when full."""
+        if self.max_size <= 0:
+            return
+        self._store(key, value)
+        path = self._path(key)
+        if path is not None:
+            try:
+                fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+                with os.fdopen(fd, "w") as f:
+                    f.write(json.dumps(value))
+            except OSError:
+                logger.warning("Failed to persist cache entry %s", key)
+
+    def _store(self, key: str, value: dict) -> None:
+        if key not in self._entries and len(self._entries) >= self.max_size:
+            victim = min(self._hits, key=self._hits.__getitem__)
+            del self._entries[victim]
+            del self._hits[victim]
+            path = self._path(victim)
+            if path is not None:
+                try:
+                    os.unlink(path)
+                except OSError:
+                    pass
+        self._entries[key] = value
+        self._hits.setdefault(key, 0)
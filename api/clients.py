@@ -0,0 +1,68 @@
+"""Kado v0 — Shared OpenAI clients.
+
+Each client owns an httpx connection pool, so building one per request
+throws away keep-alive connections and pays a fresh TLS handshake every
+time. Transcription and extraction share these lazily-built singletons.
+"""
+
+import asyncio
+import os
+import threading
+import weakref
+
+_lock = threading.Lock()
+_client = None
+_client_key: str | None = None
+# httpx async connections are bound to the loop that opened them — one
+# client per loop. The server and each pipeline worker keep a single
+# long-lived loop; short-lived loops close theirs with aclose_async_openai_client.
+_async_clients: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, tuple]" = weakref.WeakKeyDictionary()
+
+
+def get_openai_client():
+    """Return the process-wide OpenAI client for OPENAI_API_KEY.
+
+    Raises:
+        KeyError: If OPENAI_API_KEY is not set.
+    """
+    global _client, _client_key
+
+    api_key = os.environ["OPENAI_API_KEY"]
+    with _lock:
+        if _client is None or _client_key != api_key:
+            from openai import OpenAI
+
+            _client = OpenAI(api_key=api_key)
+            _client_key = api_key
+        return _client
+
+
+def get_async_openai_client():
+    """Return the AsyncOpenAI client for OPENAI_API_KEY on the running event loop.
+
+    Raises:
+        KeyError: If OPENAI_API_KEY is not set.
+    """
+    api_key = os.environ["OPENAI_API_KEY"]
+    loop = asyncio.get_running_loop()
+    with _lock:
+        cached = _async_clients.get(loop)
+        if cached is None or cached[0] != api_key:
+            from openai import AsyncOpenAI
+
+            cached = (api_key, AsyncOpenAI(api_key=api_key))
+            _async_clients[loop] = cached
+        return cached[1]
+
+
+async def aclose_async_openai_client() -> None:
+    """Close and forget the running loop's AsyncOpenAI client, if it has one.
+
+    Await this before a short-lived loop (e.g. asyncio.run) finishes, so its
+    pooled connections are shut down instead of dangling with the loop.
+    """
+    loop = asyncio.get_running_loop()
+    with _lock:
+        cached = _async_clients.pop(loop, None)
+    if cached is not None:
+        await cached[1].close()
@@ -1,17 +1,32 @@
 """Kado v0 — FastAPI application."""
 
+import asyncio
+import functools
+import hashlib
 import logging
+import multiprocessing
 import os
-import subprocess
 import tempfile
+from concurrent.futures import ProcessPoolExecutor
 from contextlib import asynccontextmanager
-from pathlib import Path
+from typing import AsyncIterator
 
-from fastapi import FastAPI, File, HTTPException, UploadFile
+from fastapi import FastAPI, File, Header, HTTPException, Response, UploadFile
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import ORJSONResponse
 
+from cache import ResultCache
 from models import AnalyzeResponse, DebugInfo
-from pipeline import run_pipeline
+from pipeline import init_worker, run_pipeline, run_pipeline_blocking
+from stages.audio import (
+    KADO_TMPDIR,
+    AudioTooLongError,
+    InvalidVideoError,
+    can_stream,
+    extract_audio_from_stream,
+    ffmpeg_available,
+)
+from stages.duration import probe_duration
 
 # Configure logging
 logging.basicConfig(
@@ -20,10 +35,33 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+# Starlette spools multipart uploads over 1 MiB to tempfile's default
+# directory before the handler runs. An explicit KADO_TMPDIR takes those as
+# well; the /dev/shm fallback doesn't, since Docker caps it at 64 MB.
+if os.environ.get("KADO_TMPDIR"):
+    tempfile.tempdir = KADO_TMPDIR
+
 # Allowed video formats
 ALLOWED_EXTENSIONS = {".mp4", ".mov", ".webm"}
 MAX_DURATION_SECONDS = 300  # 5 minutes
 
+# Uploads are copied to disk in fixed-size chunks so peak memory stays bounded
+UPLOAD_CHUNK_SIZE = 1 << 20  # 1 MiB
+
+
+# Optional pool of worker processes for running pipelines (0 = run in-process).
+# Each worker keeps its own warm transcription model / API client.
+KADO_WORKERS = int(os.environ.get("KADO_WORKERS", "0"))
+_pipeline_pool = (
+    ProcessPoolExecutor(
+        max_workers=KADO_WORKERS,
+        mp_context=multiprocessing.get_context("spawn"),
+        initializer=init_worker,
+    )
+    if KADO_WORKERS > 0
+    else None
+)
+
 
 def _is_mock_mode() -> bool:
     return os.environ.get("MOCK_MODE", "").strip() in ("1", "true", "yes")
@@ -41,12 +79,13 @@ async def lifespan(app: FastAPI):
     else:
         if not os.environ.get("OPENAI_API_KEY"):
             logger.warning("OPENAI_API_KEY is not set — /analyze will fail unless MOCK_MODE=1")
-    try:
-        subprocess.run(["ffmpeg", "-version"], capture_output=True, check=True)
+    if ffmpeg_available():
         logger.info("ffmpeg is available")
-    except (subprocess.CalledProcessError, FileNotFoundError):
+    else:
         logger.error("ffmpeg is NOT available — audio extraction will fail")
     yield
+    if _pipeline_pool is not None:
+        _pipeline_pool.shutdown(cancel_futures=True)
 
 
 app = FastAPI(
@@ -54,6 +93,7 @@ app = FastAPI(
     description="Upload narrated video → get timestamped failure events as JSON",
     version="0.1.0",
     lifespan=lifespan,
+    default_response_class=ORJSONResponse,
 )
 
 # CORS for local dev
@@ -66,38 +106,179 @@ app.add_middleware(
 )
 
 
+def _validate_cached(value: dict) -> dict:
+    """Only serve a result read back from disk if it is a well-formed AnalyzeResponse."""
+    return AnalyzeResponse.model_validate(value).model_dump()
+
+
+@functools.lru_cache(maxsize=1)
+def _result_cache(max_size: int) -> ResultCache:
+    return ResultCache(
+        max_size=max_size,
+        directory=os.path.join(KADO_TMPDIR, "kado-cache"),
+        validate=_validate_cached,
+    )
+
+
+def get_result_cache() -> ResultCache:
+    """The /analyze result cache, sized by KADO_RESULT_CACHE_SIZE (read per request)."""
+    return _result_cache(int(os.environ.get("KADO_RESULT_CACHE_SIZE", "64")))
+
+
+def _cache_key(upload_digest: str, debug: bool, transcribe_provider: str, extract_provider: str) -> str:
+    """Cache key for an upload: its content hash plus the settings that shape the result."""
+    settings = f"{app.version}:{debug}:{transcribe_provider}:{extract_provider}"
+    return hashlib.sha256(f"{upload_digest}:{settings}".encode()).hexdigest()
+
+
+def _parse_etags(header: str | None) -> list[str]:
+    """Entity tags listed in an If-None-Match header (weak tags compare equal)."""
+    if not header:
+        return []
+    tags = []
+    for tag in header.split(","):
+        tag = tag.strip().removeprefix("W/").strip('"')
+        if tag and tag != "*":
+            tags.append(tag)
+    return tags
+
+
 @app.get("/health")
 def health():
     """Health check endpoint."""
     return {"ok": True, "mock_mode": _is_mock_mode()}
 
 
-def _get_video_duration(path: str) -> float:
-    """Get video duration in seconds using ffprobe."""
-    cmd = [
-        "ffprobe",
-        "-v", "error",
-        "-show_entries", "format=duration",
-        "-of", "default=noprint_wrappers=1:nokey=1",
-        path,
-    ]
-    result = subprocess.run(cmd, capture_output=True, text=True, timeout=30)
-    if result.returncode != 0:
-        raise RuntimeError(f"ffprobe failed: {result.stderr[:300]}")
-    return float(result.stdout.strip())
+async def _iter_upload(file: UploadFile, head: bytes, digest: "hashlib._Hash") -> AsyncIterator[bytes]:
+    """Yield the upload in chunks, starting with the already-read head.
+
+    Every chunk is fed into digest so the content hash is ready once the
+    upload has been consumed.
+    """
+    if head:
+        digest.update(head)
+        yield head
+    while chunk := await file.read(UPLOAD_CHUNK_SIZE):
+        digest.update(chunk)
+        yield chunk
+
+
+async def _run_pipeline(video_path: str, **kwargs):
+    """Run the pipeline in the worker pool when configured, else on this event loop."""
+    if _pipeline_pool is None:
+        return await run_pipeline(video_path, **kwargs)
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(
+        _pipeline_pool, functools.partial(run_pipeline_blocking, video_path, **kwargs)
+    )
+
+
+async def _analyze(video_path: str | None, mock: bool, debug: bool, audio: bytes | None = None) -> dict:
+    """Run the pipeline and return the AnalyzeResponse as a plain dict.
+
+    The model is already validated, so callers serialize the dict directly
+    instead of going through jsonable_encoder.
+    """
+    if debug:
+        failures, debug_info = await _run_pipeline(
+            video_path or "", debug=True, max_duration=MAX_DURATION_SECONDS, audio=audio
+        )
+        response = AnalyzeResponse(
+            failures=failures,
+            mode="mock" if mock else "real",
+            debug=DebugInfo(**debug_info)
+        )
+    else:
+        failures = await _run_pipeline(
+            video_path or "", debug=False, max_duration=MAX_DURATION_SECONDS, audio=audio
+        )
+        response = AnalyzeResponse(failures=failures, mode="mock" if mock else "real")
+    return response.model_dump()
+
+
+def _spooled_fd(file: UploadFile) -> int | None:
+    """Return the OS fd behind an upload Starlette has already spooled to disk."""
+    spool = file.file
+    if isinstance(spool, tempfile.SpooledTemporaryFile) and getattr(spool, "_rolled", False):
+        return spool._file.fileno()
+    return None
+
+
+def _sendfile_copy(src_fd: int, offset: int, dst_fd: int, digest: "hashlib._Hash") -> bool:
+    """Copy src_fd from offset to EOF into dst_fd with sendfile(2).
+
+    The kernel moves the data; each chunk is then hashed straight from the
+    page cache into a reused buffer.
+
+    Returns:
+        False, having copied nothing, when sendfile(2) can't write to a
+        regular file — macOS and the BSDs only accept a socket as the target.
+    """
+    if not hasattr(os, "sendfile"):
+        return False
+    try:
+        sent = os.sendfile(dst_fd, src_fd, offset, UPLOAD_CHUNK_SIZE)
+    except OSError:
+        return False
+
+    buf = memoryview(bytearray(UPLOAD_CHUNK_SIZE))
+    while sent:
+        # preadv may return short; hash exactly the bytes sendfile copied
+        read = 0
+        while read < sent:
+            got = os.preadv(src_fd, [buf[read:sent]], offset + read)
+            if not got:
+                raise OSError(f"Upload spool ended {sent - read} bytes early while hashing")
+            read += got
+        digest.update(buf[:sent])
+        offset += sent
+        sent = os.sendfile(dst_fd, src_fd, offset, UPLOAD_CHUNK_SIZE)
+    return True
+
+
+async def _save_upload(file: UploadFile, ext: str, head: bytes, digest: "hashlib._Hash") -> str:
+    """Copy the upload to a temp file in KADO_TMPDIR and return its path.
+
+    Large uploads are already on disk in Starlette's spool file, so those are
+    copied file-to-file in the kernel where the platform allows it; small
+    in-memory ones are written in chunks.
+    """
+    with tempfile.NamedTemporaryFile(suffix=ext, dir=KADO_TMPDIR, delete=False) as tmp:
+        try:
+            src_fd = _spooled_fd(file)
+            copied = False
+            if src_fd is not None:
+                digest.update(head)
+                tmp.write(head)
+                tmp.flush()
+                head = b""
+                copied = await asyncio.to_thread(_sendfile_copy, src_fd, file.file.tell(), tmp.fileno(), digest)
+            if not copied:
+                async for chunk in _iter_upload(file, head, digest):
+                    await asyncio.to_thread(tmp.write, chunk)
+        except BaseException:
+            os.unlink(tmp.name)
+            raise
+        return tmp.name
 
 
 @app.post("/analyze", response_model=AnalyzeResponse)
-async def analyze(file: UploadFile = File(...)):
+async def analyze(
+    file: UploadFile = File(...),
+    if_none_match: str | None = Header(default=None),
+):
     """Upload a narrated video and get back detected failure events.
 
-    Accepts mp4, mov, or webm files up to 5 minutes long.
+    Accepts mp4, mov, or webm files up to 5 minutes long. Responses carry an
+    ETag of the upload's SHA-256; sending it back in If-None-Match returns
+    304 when the result is still cached, without processing the upload.
     """
     # Validate file extension
     if not file.filename:
         raise HTTPException(status_code=400, detail="No filename provided")
 
-    ext = Path(file.filename).suffix.lower()
+    _, dot, tail = file.filename.rpartition(".")
+    ext = "." + tail.lower() if dot else ""
     if ext not in ALLOWED_EXTENSIONS:
         raise HTTPException(
             status_code=400,
@@ -118,6 +299,13 @@ async def analyze(file: UploadFile = File(...)):
                 detail="OPENAI_API_KEY is not configured. Set the env var or enable MOCK_MODE=1.",
             )
         
+        # The Batch API can take up to 24h — far too long to hold a request open
+        if extract_provider == "openai" and os.environ.get("EXTRACT_MODE", "").strip().lower() == "batch_api":
+            raise HTTPException(
+                status_code=501,
+                detail="EXTRACT_MODE=batch_api is for offline runs (python pipeline.py VIDEO). Unset it for /analyze.",
+            )
+
         # Check Gemini API key
         if extract_provider == "gemini" and not os.environ.get("GEMINI_API_KEY"):
             raise HTTPException(
@@ -125,52 +313,83 @@ async def analyze(file: UploadFile = File(...)):
                 detail="GEMINI_API_KEY is not configured. Set the env var when using EXTRACT_PROVIDER=gemini.",
             )
 
-    # Save to temp file
+    debug_enabled = _is_debug_mode()
+    result_cache = get_result_cache()
     tmp_path: str | None = None
+    audio: bytes | None = None
     try:
-        with tempfile.NamedTemporaryFile(suffix=ext, delete=False) as tmp:
-            tmp_path = tmp.name
-            content = await file.read()
-            tmp.write(content)
+        if mock:
+            # Fixtures don't depend on the upload — don't read or store it
+            await file.close()
+            logger.info("Starting pipeline for %s (mock=True, debug=%s)", file.filename, debug_enabled)
+            return ORJSONResponse(await _analyze(None, mock=True, debug=debug_enabled))
+
+        # Client already holds the result for this upload
+        for tag in _parse_etags(if_none_match):
+            if result_cache.get(_cache_key(tag, debug_enabled, transcribe_provider, extract_provider)) is not None:
+                await file.close()
+                logger.info("Result cache hit for %s via If-None-Match", file.filename)
+                return Response(status_code=304, headers={"ETag": f'"{tag}"'})
 
-        # Validate duration (skip in mock mode — any file works)
+        digest = hashlib.sha256()
+        head = await file.read(UPLOAD_CHUNK_SIZE)
         duration = 0.0
-        if not mock:
-            try:
-                duration = _get_video_duration(tmp_path)
-                if duration > MAX_DURATION_SECONDS:
-                    raise HTTPException(
-                        status_code=400,
-                        detail=f"Video is {duration:.0f}s — max allowed is {MAX_DURATION_SECONDS}s (5 min)",
-                    )
-            except RuntimeError as e:
-                raise HTTPException(status_code=400, detail=f"Cannot read video metadata: {e}")
+        if can_stream(ext, head):
+            # Pipe the upload straight into ffmpeg — no temp copy of the video.
+            # The duration limit is enforced by the extraction itself.
+            logger.info("Streaming %s directly into ffmpeg", file.filename)
+            upload = _iter_upload(file, head, digest)
+            audio = await extract_audio_from_stream(upload, ext, max_duration=MAX_DURATION_SECONDS)
+            # The ETag and cache key must cover the whole upload, even any
+            # part ffmpeg didn't need
+            async for _ in upload:
+                pass
+        else:
+            tmp_path = await _save_upload(file, ext, head, digest)
+
+            # Validate duration from the container header when it's readable.
+            # Otherwise extraction enforces the limit itself.
+            duration = probe_duration(tmp_path) or 0.0
+            if duration > MAX_DURATION_SECONDS:
+                raise HTTPException(
+                    status_code=400,
+                    detail=f"Video is {duration:.0f}s — max allowed is {MAX_DURATION_SECONDS}s (5 min)",
+                )
+
+        # Identical uploads under the same settings reuse the earlier result
+        etag = digest.hexdigest()
+        headers = {"ETag": f'"{etag}"'}
+        cache_key = _cache_key(etag, debug_enabled, transcribe_provider, extract_provider)
+        cached = result_cache.get(cache_key)
+        if cached is not None:
+            logger.info("Result cache hit for %s", file.filename)
+            return ORJSONResponse(cached, headers=headers)
 
         # Run the pipeline
-        debug_enabled = _is_debug_mode()
-        logger.info("Starting pipeline for %s (%.1fs, mock=%s, debug=%s)", file.filename, duration, mock, debug_enabled)
-        
-        if debug_enabled:
-            failures, debug_info = run_pipeline(tmp_path, debug=True)
-            return AnalyzeResponse(
-                failures=failures,
-                mode="mock" if mock else "real",
-                debug=DebugInfo(**debug_info)
-            )
-        else:
-            failures = run_pipeline(tmp_path, debug=False)
-            return AnalyzeResponse(failures=failures, mode="mock" if mock else "real")
+        logger.info("Starting pipeline for %s (%.1fs, debug=%s)", file.filename, duration, debug_enabled)
+        body = await _analyze(tmp_path, mock=False, debug=debug_enabled, audio=audio)
+        result_cache.put(cache_key, body)
+        return ORJSONResponse(body, headers=headers)
 
     except HTTPException:
         raise
+    except AudioTooLongError:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Video is longer than the max allowed {MAX_DURATION_SECONDS}s (5 min)",
+        )
+    except InvalidVideoError as e:
+        raise HTTPException(status_code=400, detail=f"Cannot read video: {e}")
     except Exception as e:
         logger.exception("Pipeline error")
         raise HTTPException(status_code=500, detail=f"Analysis failed: {str(e)}")
     finally:
         # Always clean up the uploaded temp file
-        if tmp_path and Path(tmp_path).exists():
+        if tmp_path:
             try:
                 os.unlink(tmp_path)
                 logger.info("Cleaned up temp upload: %s", tmp_path)
+            except FileNotFoundError:
+                pass
             except OSError:
                 logger.warning("Failed to clean up %s", tmp_path)
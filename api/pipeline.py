@@ -1,23 +1,27 @@
 """Kado v0 — Pipeline orchestrator.
 
-Runs the full analysis pipeline synchronously:
+Runs the full analysis pipeline as a coroutine:
   video → audio → transcript → candidates → LLM extraction → dedupe → result
 """
 
+import asyncio
+import itertools
 import logging
 import os
-from pathlib import Path
-from typing import Union
+from typing import Optional, Union
 
 from models import FailureEvent, TranscriptSegment
 from stages.audio import extract_audio
-from stages.transcribe import transcribe
+from stages.transcribe import get_transcribe_client, transcribe
 from stages.candidates import detect_candidates, build_windows
-from stages.extract import extract_failures
+from stages.extract import aextract_failures_batch
 from stages.dedupe import merge_and_dedupe
 
 logger = logging.getLogger(__name__)
 
+# Long-lived event loop for run_pipeline_blocking (one per worker process)
+_loop: Optional[asyncio.AbstractEventLoop] = None
+
 
 def _is_mock_mode() -> bool:
     return os.environ.get("MOCK_MODE", "").strip() in ("1", "true", "yes")
@@ -27,12 +31,35 @@ def _is_debug_mode() -> bool:
     return os.environ.get("DEBUG", "").strip() in ("1", "true", "yes")
 
 
-def run_pipeline(video_path: str, debug: bool = False) -> Union[list[FailureEvent], tuple[list[FailureEvent], dict]]:
+def _llm_concurrency() -> int:
+    """Max LLM extraction requests in flight per pipeline run."""
+    return max(1, int(os.environ.get("KADO_LLM_CONCURRENCY", "8")))
+
+
+async def _warm_transcriber() -> None:
+    """Load the transcription model/client off the event loop.
+
+    Best effort: if it fails here, Stage 2 raises the real error.
+    """
+    try:
+        await asyncio.to_thread(get_transcribe_client)
+    except Exception as e:
+        logger.warning("Could not preload transcriber: %s", e)
+
+
+async def run_pipeline(
+    video_path: str,
+    debug: bool = False,
+    max_duration: Optional[float] = None,
+    audio: Optional[bytes] = None,
+) -> Union[list[FailureEvent], tuple[list[FailureEvent], dict]]:
     """Run the full Kado analysis pipeline on a video file.
 
     Args:
         video_path: Path to the uploaded video.
         debug: If True, returns (failures, debug_info) tuple with pipeline stats.
+        max_duration: Reject videos longer than this (enforced during audio extraction).
+        audio: WAV already extracted from the upload stream. Stage 1 is skipped.
 
     Returns:
         If debug=False: Sorted list of deduplicated FailureEvent objects.
@@ -40,75 +67,113 @@ def run_pipeline(video_path: str, debug: bool = False) -> Union[list[FailureEven
                        num_segments, num_candidates, num_windows.
     """
     mock = _is_mock_mode()
-    wav_path: str | None = None
     
     # Debug tracking
     debug_info = {"num_segments": 0, "num_candidates": 0, "num_windows": 0}
 
+    # Stage 1: Extract audio (skip in mock mode — transcribe uses fixtures)
+    if mock:
+        logger.info("Stage 1: MOCK — skipping audio extraction")
+    elif audio:
+        logger.info("Stage 1: Audio already extracted (%d bytes)", len(audio))
+    else:
+        # Load the transcriber while ffmpeg runs — neither depends on the other
+        logger.info("Stage 1: Extracting audio from %s", video_path)
+        audio, _ = await asyncio.gather(
+            extract_audio(video_path, max_duration=max_duration),
+            _warm_transcriber(),
+        )
+        logger.info("Audio extracted (%d bytes)", len(audio))
+
+    # Stage 2: Transcribe
+    logger.info("Stage 2: Transcribing audio%s", " (MOCK)" if mock else "")
+    segments: list[TranscriptSegment] = await asyncio.to_thread(transcribe, audio or b"")
+    logger.info("Got %d transcript segments", len(segments))
+    
+    debug_info["num_segments"] = len(segments)
+
+    if not segments:
+        logger.warning("No transcript segments found — returning empty results")
+        return ([], debug_info) if debug else []
+
+    # Stage 3: Candidate detection
+    logger.info("Stage 3: Detecting candidates")
+    candidate_indices = detect_candidates(segments)
+    logger.info("Found %d candidate segments", len(candidate_indices))
+    
+    debug_info["num_candidates"] = len(candidate_indices)
+
+    if not candidate_indices:
+        logger.info("No candidate segments — returning empty results")
+        return ([], debug_info) if debug else []
+
+    # Stage 4: Build windows
+    logger.info("Stage 4: Building context windows")
+    spans = build_windows(segments, candidate_indices)
+    logger.info("Built %d windows", len(spans))
+    
+    debug_info["num_windows"] = len(spans)
+
+    # Stage 5: LLM extraction, all windows in one batched call
+    logger.info("Stage 5: Running LLM extraction on %d windows", len(spans))
+    windows = [segments[start:end] for start, end in spans]
+    results = await aextract_failures_batch(windows, concurrency=_llm_concurrency())
+    all_failures: list[FailureEvent] = list(itertools.chain.from_iterable(results))
+
+    logger.info("Total raw failures: %d", len(all_failures))
+
+    if not all_failures:
+        return ([], debug_info) if debug else []
+
+    # Stage 6: Merge/dedupe
+    logger.info("Stage 6: Merging and deduplicating")
+    result = merge_and_dedupe(all_failures)
+    logger.info("Final failures after dedupe: %d", len(result))
+
+    return (result, debug_info) if debug else result
+
+
+def init_worker() -> None:
+    """Process-pool initializer: load the transcriber once per worker process."""
     try:
-        # Stage 1: Extract audio (skip in mock mode — transcribe uses fixtures)
-        if mock:
-            logger.info("Stage 1: MOCK — skipping audio extraction")
-        else:
-            logger.info("Stage 1: Extracting audio from %s", video_path)
-            wav_path = extract_audio(video_path)
-            logger.info("Audio extracted to %s", wav_path)
-
-        # Stage 2: Transcribe
-        logger.info("Stage 2: Transcribing audio%s", " (MOCK)" if mock else "")
-        segments: list[TranscriptSegment] = transcribe(wav_path or "")
-        logger.info("Got %d transcript segments", len(segments))
-        
-        debug_info["num_segments"] = len(segments)
-
-        if not segments:
-            logger.warning("No transcript segments found — returning empty results")
-            return ([], debug_info) if debug else []
-
-        # Stage 3: Candidate detection
-        logger.info("Stage 3: Detecting candidates")
-        candidate_indices = detect_candidates(segments)
-        logger.info("Found %d candidate segments", len(candidate_indices))
-        
-        debug_info["num_candidates"] = len(candidate_indices)
-
-        if not candidate_indices:
-            logger.info("No candidate segments — returning empty results")
-            return ([], debug_info) if debug else []
-
-        # Stage 4: Build windows
-        logger.info("Stage 4: Building context windows")
-        windows = build_windows(segments, candidate_indices)
-        logger.info("Built %d windows", len(windows))
-        
-        debug_info["num_windows"] = len(windows)
-
-        # Stage 5: LLM extraction per window
-        logger.info("Stage 5: Running LLM extraction on each window")
-        all_failures: list[FailureEvent] = []
-        for i, window in enumerate(windows):
-            logger.info("  Processing window %d/%d", i + 1, len(windows))
-            failures = extract_failures(window)
-            all_failures.extend(failures)
-            logger.info("  → %d failures found", len(failures))
-
-        logger.info("Total raw failures: %d", len(all_failures))
-
-        if not all_failures:
-            return ([], debug_info) if debug else []
-
-        # Stage 6: Merge/dedupe
-        logger.info("Stage 6: Merging and deduplicating")
-        result = merge_and_dedupe(all_failures)
-        logger.info("Final failures after dedupe: %d", len(result))
-
-        return (result, debug_info) if debug else result
-
-    finally:
-        # Cleanup WAV temp file
-        if wav_path and Path(wav_path).exists():
-            try:
-                os.unlink(wav_path)
-                logger.info("Cleaned up temp WAV: %s", wav_path)
-            except OSError:
-                logger.warning("Failed to clean up %s", wav_path)
+        get_transcribe_client()
+    except Exception as e:
+        logger.warning("Could not preload transcriber in worker: %s", e)
+
+
+def _worker_loop() -> asyncio.AbstractEventLoop:
+    """This process's event loop for run_pipeline_blocking, created on first use."""
+    global _loop
+    if _loop is None:
+        _loop = asyncio.new_event_loop()
+    return _loop
+
+
+def run_pipeline_blocking(
+    video_path: str,
+    debug: bool = False,
+    max_duration: Optional[float] = None,
+    audio: Optional[bytes] = None,
+) -> Union[list[FailureEvent], tuple[list[FailureEvent], dict]]:
+    """Synchronous entry point for running the pipeline in a worker process.
+
+    Every run in the process shares one event loop, so the AsyncOpenAI client
+    built on it, and its keep-alive connections, carry over between runs.
+    """
+    return _worker_loop().run_until_complete(
+        run_pipeline(video_path, debug=debug, max_duration=max_duration, audio=audio)
+    )
+
+
+if __name__ == "__main__":
+    # Offline entry point: python pipeline.py VIDEO [MAX_DURATION]. The only
+    # way to use EXTRACT_MODE=batch_api, which /analyze rejects.
+    import sys
+
+    import orjson
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(name)s — %(message)s")
+    if len(sys.argv) not in (2, 3):
+        sys.exit("Usage: python pipeline.py VIDEO [MAX_DURATION]")
+    failures = run_pipeline_blocking(sys.argv[1], max_duration=float(sys.argv[2]) if len(sys.argv) == 3 else None)
+    sys.stdout.buffer.write(orjson.dumps([f.model_dump() for f in failures], option=orjson.OPT_INDENT_2) + b"\n")
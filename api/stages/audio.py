@@ -1,45 +1,268 @@
 """Stage 1 — Extract audio from video using ffmpeg."""
 
+import asyncio
+import json
+import os
+import shutil
+import struct
 import subprocess
 import tempfile
 from pathlib import Path
+from typing import AsyncIterable, Awaitable, Optional
 
+from stages.duration import iter_boxes
 
-def extract_audio(video_path: str) -> str:
+# Scratch directory for uploads and cache files (and, when set explicitly,
+# Starlette's upload spool). Prefer the RAM-backed /dev/shm so these
+# short-lived files never touch the disk.
+KADO_TMPDIR = os.environ.get("KADO_TMPDIR") or (
+    "/dev/shm" if os.path.isdir("/dev/shm") else tempfile.gettempdir()
+)
+
+# Resolve the binary once instead of walking PATH on every exec
+FFMPEG = shutil.which("ffmpeg") or "ffmpeg"
+
+# Mono 16-bit PCM at 16 kHz
+SAMPLE_RATE = 16000
+WAV_BYTES_PER_SECOND = SAMPLE_RATE * 2
+
+# Run many small ffmpeg processes rather than a few that each spawn a thread
+# per core: cap concurrent extractions and split the cores between them.
+FFMPEG_CONCURRENCY = max(1, int(os.environ.get("KADO_FFMPEG_CONCURRENCY") or os.cpu_count() or 1))
+FFMPEG_THREADS = max(1, (os.cpu_count() or 1) // FFMPEG_CONCURRENCY)
+_ffmpeg_slots = asyncio.Semaphore(FFMPEG_CONCURRENCY)
+
+# ffmpeg demuxers for formats that can be decoded from a non-seekable pipe
+PIPE_FORMATS = {".webm": "webm", ".mp4": "mp4", ".mov": "mov"}
+
+_PROBE_CACHE = Path(KADO_TMPDIR) / "kado-ffmpeg-probe.json"
+
+
+def ffmpeg_available() -> bool:
+    """Check that ffmpeg runs, reusing a cached probe while the binary is unchanged.
+
+    The result of ``ffmpeg -version`` is recorded next to the scratch files,
+    keyed by the binary's path and mtime, so restarted workers skip the exec.
+    """
+    try:
+        mtime_ns = os.stat(FFMPEG).st_mtime_ns
+    except OSError:
+        return False
+
+    try:
+        cached = json.loads(_PROBE_CACHE.read_text())
+        if cached.get("path") == FFMPEG and cached.get("mtime_ns") == mtime_ns:
+            return True
+    except (OSError, ValueError):
+        pass
+
+    try:
+        subprocess.run([FFMPEG, "-version"], capture_output=True, check=True)
+    except (subprocess.CalledProcessError, OSError):
+        return False
+
+    try:
+        _PROBE_CACHE.write_text(json.dumps({"path": FFMPEG, "mtime_ns": mtime_ns}))
+    except OSError:
+        pass
+    return True
+
+
+class AudioTooLongError(ValueError):
+    """The decoded audio runs past the allowed duration."""
+
+    def __init__(self, max_duration: float):
+        # Keep args as the constructor input so the error survives pickling
+        # back from a worker process.
+        super().__init__(max_duration)
+        self.max_duration = max_duration
+
+    def __str__(self) -> str:
+        return f"Video is longer than the {self.max_duration:.0f}s limit"
+
+
+class InvalidVideoError(RuntimeError):
+    """ffmpeg could not decode the upload — it is corrupt or not a video."""
+
+
+def _ffmpeg_error(stderr: bytes) -> InvalidVideoError:
+    return InvalidVideoError(f"ffmpeg failed: {stderr.decode(errors='replace')[:500]}")
+
+
+def _ffmpeg_cmd(source: str, max_duration: Optional[float], input_format: Optional[str] = None) -> list[str]:
+    threads = str(FFMPEG_THREADS)
+    cmd = [FFMPEG, "-nostats", "-loglevel", "error", "-filter_threads", threads, "-threads", threads]
+    if input_format:
+        cmd += ["-f", input_format]
+    cmd += ["-i", source]
+    if max_duration is not None:
+        cmd += ["-t", str(max_duration + 1)]
+    cmd += [
+        "-ac", "1",          # mono
+        "-ar", str(SAMPLE_RATE),
+        "-f", "wav",
+        "pipe:1",            # WAV goes to stdout, never to disk
+    ]
+    return cmd
+
+
+async def _communicate(
+    proc: asyncio.subprocess.Process,
+    output: Optional[Awaitable[tuple[bytes, bytes]]] = None,
+    timeout: float = 120,
+) -> tuple[bytes, bytes]:
+    """Wait for ffmpeg's (stdout, stderr), killing it if it runs past the timeout."""
+    try:
+        return await asyncio.wait_for(output or proc.communicate(), timeout=timeout)
+    except asyncio.TimeoutError:
+        proc.kill()
+        await proc.wait()
+        raise RuntimeError("ffmpeg timed out")
+
+
+def _finish_wav(wav: bytes, max_duration: Optional[float]) -> bytes:
+    """Fill in the WAV sizes ffmpeg can't seek back to write on a pipe.
+
+    Also enforces max_duration from the amount of PCM data produced.
+    """
+    data_at = wav.find(b"data", 12)
+    if data_at < 0:
+        raise InvalidVideoError("ffmpeg produced no audio")
+
+    data_size = len(wav) - data_at - 8
+    if max_duration is not None and data_size / WAV_BYTES_PER_SECOND > max_duration:
+        raise AudioTooLongError(max_duration)
+
+    header = bytearray(wav[:data_at + 8])
+    struct.pack_into("<I", header, 4, len(wav) - 8)
+    struct.pack_into("<I", header, data_at + 4, data_size)
+    return b"".join((header, memoryview(wav)[data_at + 8:]))
+
+
+async def extract_audio(video_path: str, max_duration: Optional[float] = None) -> bytes:
     """Convert video to mono WAV at 16 kHz using ffmpeg.
 
+    The WAV is read from ffmpeg's stdout and returned in memory. When
+    max_duration is given, ffmpeg decodes at most one second past it and the
+    length is read back from the PCM size — this doubles as the duration
+    check, so no separate ffprobe pass is needed.
+
     Args:
         video_path: Path to the uploaded video file.
+        max_duration: Reject videos longer than this many seconds.
 
     Returns:
-        Path to the generated WAV file (caller must clean up).
+        The WAV file contents.
 
     Raises:
-        RuntimeError: If ffmpeg fails.
+        InvalidVideoError: If ffmpeg cannot decode the input.
+        RuntimeError: If ffmpeg times out.
+        AudioTooLongError: If the audio exceeds max_duration.
     """
-    wav_path = tempfile.mktemp(suffix=".wav")
+    cmd = _ffmpeg_cmd(video_path, max_duration)
 
-    cmd = [
-        "ffmpeg",
-        "-i", video_path,
-        "-ac", "1",          # mono
-        "-ar", "16000",      # 16 kHz
-        "-f", "wav",
-        "-y",                # overwrite
-        wav_path,
-    ]
+    async with _ffmpeg_slots:
+        proc = await asyncio.create_subprocess_exec(
+            *cmd,
+            stdin=asyncio.subprocess.DEVNULL,
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.PIPE,
+        )
+        wav, stderr = await _communicate(proc)
+
+    if proc.returncode != 0:
+        raise _ffmpeg_error(stderr)
+
+    return _finish_wav(wav, max_duration)
+
+
+def can_stream(ext: str, head: bytes) -> bool:
+    """Whether ffmpeg can decode this upload from a pipe, judging by its first bytes.
+
+    WebM always can. MP4/MOV only when ``moov`` precedes ``mdat`` (faststart),
+    otherwise the demuxer needs to seek to the end of the file.
+    """
+    if ext == ".webm":
+        return True
+    try:
+        for box_type, _, _ in iter_boxes(head, 0, len(head)):
+            if box_type == b"moov":
+                return True
+            if box_type == b"mdat":
+                return False
+    except (ValueError, struct.error):
+        pass
+    return False
+
+
+async def extract_audio_from_stream(
+    chunks: AsyncIterable[bytes],
+    ext: str,
+    max_duration: Optional[float] = None,
+) -> bytes:
+    """Like extract_audio, but feeds the video to ffmpeg's stdin as it arrives.
+
+    Skips the temp copy of the video that extract_audio needs. Starlette has
+    still spooled any upload over 1 MiB to a temp file before the handler
+    runs (in KADO_TMPDIR when that is set). Only use for inputs
+    where can_stream() is true.
+
+    Args:
+        chunks: The video bytes, in order.
+        ext: Upload extension (selects the ffmpeg demuxer).
+        max_duration: Reject videos longer than this many seconds.
+
+    Returns:
+        The WAV file contents.
+
+    Raises:
+        InvalidVideoError: If ffmpeg cannot decode the input.
+        RuntimeError: If ffmpeg times out.
+        AudioTooLongError: If the audio exceeds max_duration.
+    """
+    cmd = _ffmpeg_cmd("pipe:0", max_duration, input_format=PIPE_FORMATS[ext])
+
+    async with _ffmpeg_slots:
+        proc = await asyncio.create_subprocess_exec(
+            *cmd,
+            stdin=asyncio.subprocess.PIPE,
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.PIPE,
+        )
+        # Drain stdout and stderr while feeding stdin, or the pipes fill up and
+        # deadlock. Not via communicate(): from Python 3.12 it closes stdin
+        # underneath the writer.
+        stdout = asyncio.ensure_future(proc.stdout.read())
+        stderr = asyncio.ensure_future(proc.stderr.read())
+
+        async def output() -> tuple[bytes, bytes]:
+            result = await asyncio.gather(stdout, stderr)
+            await proc.wait()
+            return result
 
-    result = subprocess.run(
-        cmd,
-        capture_output=True,
-        text=True,
-        timeout=120,
-    )
+        stopped_reading = False
+        try:
+            async for chunk in chunks:
+                proc.stdin.write(chunk)
+                await proc.stdin.drain()
+        except (BrokenPipeError, ConnectionResetError):
+            # ffmpeg closed its end — it either hit the -t cap or failed
+            stopped_reading = True
+        except BaseException:
+            proc.kill()
+            await output()
+            raise
+        else:
+            proc.stdin.close()
 
-    if result.returncode != 0:
-        raise RuntimeError(f"ffmpeg failed: {result.stderr[:500]}")
+        wav, err = await _communicate(proc, output())
 
-    if not Path(wav_path).exists():
-        raise RuntimeError("ffmpeg produced no output file")
+    if proc.returncode != 0:
+        raise _ffmpeg_error(err)
 
-    return wav_path
+    wav = _finish_wav(wav, max_duration)
+    if stopped_reading:
+        # Past the cap _finish_wav has already raised AudioTooLongError, so
+        # ffmpeg gave up on the input without decoding all of it
+        raise InvalidVideoError("ffmpeg stopped reading the upload before its end")
+    return wav
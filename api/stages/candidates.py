@@ -1,7 +1,14 @@
 """Stage 3 — Candidate detection and window building."""
 
+import re
+
 from models import TranscriptSegment
 
+try:
+    import ahocorasick
+except ImportError:  # optional: falls back to the regex below
+    ahocorasick = None
+
 # Keywords that signal a potential failure in narrated video
 FAILURE_KEYWORDS: list[str] = [
     "doesn't",
@@ -19,33 +26,75 @@ FAILURE_KEYWORDS: list[str] = [
     "problem",
 ]
 
+# All keywords in one pattern, so each segment is scanned once. Matched
+# against the segment's lowercased text, so no IGNORECASE needed.
+_FAILURE_RE = re.compile("|".join(re.escape(kw.lower()) for kw in FAILURE_KEYWORDS))
+
+
+def _build_automaton():
+    """Aho-Corasick automaton over FAILURE_KEYWORDS, or None without pyahocorasick.
+
+    Matching is O(len(text)) however many keywords there are.
+    """
+    if ahocorasick is None:
+        return None
+    automaton = ahocorasick.Automaton()
+    for kw in FAILURE_KEYWORDS:
+        automaton.add_word(kw.lower(), kw)
+    automaton.make_automaton()
+    return automaton
+
+
+_FAILURE_AUTOMATON = _build_automaton()
+
 
 def detect_candidates(segments: list[TranscriptSegment]) -> list[int]:
     """Return indices of segments whose text contains any failure keyword.
 
     Case-insensitive matching.
     """
-    candidates: list[int] = []
-    for i, seg in enumerate(segments):
-        lower_text = seg.text.lower()
-        if any(kw in lower_text for kw in FAILURE_KEYWORDS):
-            candidates.append(i)
-    return candidates
+    if _FAILURE_AUTOMATON is not None:
+        matches = _FAILURE_AUTOMATON.iter
+        return [i for i, seg in enumerate(segments) if next(matches(seg.text.lower()), None) is not None]
+
+    search = _FAILURE_RE.search
+    return [i for i, seg in enumerate(segments) if search(seg.text.lower())]
+
+
+# A merged window never grows past this many segments, so a dense run of
+# candidates can't become one prompt whose reply outgrows its token budget
+MAX_WINDOW_SEGMENTS = 25
 
 
 def build_windows(
     segments: list[TranscriptSegment],
     candidate_indices: list[int],
     radius: int = 2,
-) -> list[list[TranscriptSegment]]:
+    merge_overlapping: bool = True,
+    max_segments: int = MAX_WINDOW_SEGMENTS,
+) -> list[tuple[int, int]]:
     """Build context windows of ±radius segments around each candidate.
 
-    Overlapping windows are NOT merged — the LLM sees each candidate
-    in its own context. Deduplication happens later.
+    Windows that share segments are merged into one, so nearby candidates
+    are sent to the LLM together instead of repeating the same transcript.
+    Windows that merely touch stay separate, and a merge that would span
+    more than max_segments starts a new (overlapping) window instead. With
+    merge_overlapping=False every candidate gets its own window;
+    deduplication happens later.
+
+    Returns:
+        (start, end) index pairs into segments, end exclusive. Consumers
+        slice ``segments[start:end]`` only when they need the window.
     """
-    windows: list[list[TranscriptSegment]] = []
-    for idx in candidate_indices:
-        start = max(0, idx - radius)
-        end = min(len(segments), idx + radius + 1)
-        windows.append(segments[start:end])
-    return windows
+    last = len(segments)
+    if not merge_overlapping:
+        return [(max(0, idx - radius), min(last, idx + radius + 1)) for idx in candidate_indices]
+
+    spans: list[tuple[int, int]] = []
+    for idx in sorted(candidate_indices):
+        start, end = max(0, idx - radius), min(last, idx + radius + 1)
+        if spans and start < spans[-1][1] and end - spans[-1][0] <= max_segments:
+            spans[-1] = (spans[-1][0], end)
+        else:
+            spans.append((start, end))
+    return spans
@@ -1,26 +1,101 @@
 """Stage 5 — Merge and deduplicate failure events."""
 
+from typing import Optional
+
 from models import FailureEvent
 
 
-def _jaccard_similarity(a: str, b: str) -> float:
-    """Word-level Jaccard similarity between two strings."""
-    words_a = set(a.lower().split())
-    words_b = set(b.lower().split())
-    if not words_a and not words_b:
+# Events further apart than this are never duplicates
+DUPLICATE_WINDOW_SECONDS = 30.0
+
+# Titles whose word-level Jaccard similarity exceeds this describe the same failure
+TITLE_SIMILARITY_THRESHOLD = 0.5
+
+# From this many events up, all pairwise similarities come from one matrix product
+VECTORIZE_MIN_EVENTS = 64
+
+
+def _title_tokens(title: str) -> frozenset[str]:
+    return frozenset(title.lower().split())
+
+
+def _jaccard_sets(a: frozenset[str], b: frozenset[str], threshold: float = 0.0) -> float:
+    """Jaccard similarity of two token sets.
+
+    Only the intersection is built; the union size is |A| + |B| - |A ∩ B|.
+    Similarity can never exceed min(|A|, |B|) / max(|A|, |B|), so when that
+    ratio is already at or below ``threshold`` this returns 0.0 without
+    touching the sets.
+    """
+    len_a, len_b = len(a), len(b)
+    if not len_a and not len_b:
+        return 1.0
+    if not len_a or not len_b:
+        return 0.0
+    if min(len_a, len_b) <= threshold * max(len_a, len_b):
+        return 0.0
+    intersection = len(a & b)
+    return intersection / (len_a + len_b - intersection)
+
+
+def _title_bitmasks(tokens: list[frozenset[str]]) -> list[int]:
+    """Intern every token and encode each title as an int with one bit per word."""
+    vocab: dict[str, int] = {}
+    masks = []
+    for title_tokens in tokens:
+        mask = 0
+        for token in title_tokens:
+            mask |= 1 << vocab.setdefault(token, len(vocab))
+        masks.append(mask)
+    return masks
+
+
+def _jaccard_bits(a: int, b: int, threshold: float = 0.0) -> float:
+    """_jaccard_sets for titles encoded by _title_bitmasks.
+
+    Set sizes and the intersection are popcounts, so no hashing happens.
+    """
+    len_a, len_b = a.bit_count(), b.bit_count()
+    if not len_a and not len_b:
         return 1.0
-    if not words_a or not words_b:
+    if not len_a or not len_b:
+        return 0.0
+    if min(len_a, len_b) <= threshold * max(len_a, len_b):
         return 0.0
-    intersection = words_a & words_b
-    union = words_a | words_b
-    return len(intersection) / len(union)
+    intersection = (a & b).bit_count()
+    return intersection / (len_a + len_b - intersection)
 
 
-def _are_duplicates(a: FailureEvent, b: FailureEvent) -> bool:
-    """Two events are duplicates if timestamps are within 30s AND titles are similar."""
-    time_close = abs(a.timestamp_seconds - b.timestamp_seconds) <= 30.0
-    title_similar = _jaccard_similarity(a.title, b.title) > 0.5
-    return time_close and title_similar
+def _jaccard_similarity(a: str, b: str) -> float:
+    """Word-level Jaccard similarity between two strings."""
+    return _jaccard_sets(_title_tokens(a), _title_tokens(b))
+
+
+def _similarity_matrix(tokens: list[frozenset[str]]):
+    """Pairwise Jaccard similarity of every token set, as an n×n NumPy array.
+
+    Each title becomes a 0/1 row over the shared vocabulary, so M @ M.T
+    gives every intersection size in a single BLAS call. Returns None when
+    NumPy is not installed.
+    """
+    try:
+        import numpy as np
+    except ImportError:
+        return None
+
+    vocab: dict[str, int] = {}
+    rows = [[vocab.setdefault(t, len(vocab)) for t in ts] for ts in tokens]
+    # float32 rather than uint8: matmul only goes through BLAS for floats,
+    # and small ints would overflow on long titles
+    bits = np.zeros((len(tokens), max(len(vocab), 1)), dtype=np.float32)
+    for i, cols in enumerate(rows):
+        bits[i, cols] = 1.0
+
+    intersection = bits @ bits.T
+    sizes = bits.sum(axis=1)
+    union = sizes[:, None] + sizes[None, :] - intersection
+    # Two empty titles count as identical, matching _jaccard_sets
+    return np.divide(intersection, union, out=np.ones_like(intersection), where=union > 0)
 
 
 def _merge_events(keep: FailureEvent, drop: FailureEvent) -> FailureEvent:
@@ -52,25 +127,54 @@ def merge_and_dedupe(events: list[FailureEvent]) -> list[FailureEvent]:
     if not events:
         return []
 
-    # Sort by timestamp first for stable processing
-    sorted_events = sorted(events, key=lambda e: e.timestamp_seconds)
+    # Sort by timestamp, higher confidence first on ties, so a cluster's
+    # first event is usually also the one the merge keeps
+    sorted_events = sorted(events, key=lambda e: (e.timestamp_seconds, -e.confidence))
+
+    # Tokenize each title once up front; the loop below only compares
+    tokens = [_title_tokens(e.title) for e in sorted_events]
+    similarity: Optional[object] = None
+    if len(sorted_events) >= VECTORIZE_MIN_EVENTS:
+        similarity = _similarity_matrix(tokens)
+    if similarity is None:
+        masks = _title_bitmasks(tokens)
 
     merged: list[FailureEvent] = []
     used: set[int] = set()
+    needs_resort = False
 
     for i, event_a in enumerate(sorted_events):
         if i in used:
             continue
 
         current = event_a
+        # The merged event always carries one input's title and timestamp;
+        # rep is that input's index, so pairwise similarities stay valid.
+        rep = i
         for j in range(i + 1, len(sorted_events)):
+            candidate = sorted_events[j]
+            # Sorted by time, so nothing further on can be within the window.
+            # current's timestamp only moves forward when merging, so this holds.
+            if candidate.timestamp_seconds - current.timestamp_seconds > DUPLICATE_WINDOW_SECONDS:
+                break
             if j in used:
                 continue
-            if _are_duplicates(current, sorted_events[j]):
-                current = _merge_events(current, sorted_events[j])
+            if similarity is not None:
+                score = similarity[rep, j]
+            else:
+                score = _jaccard_bits(masks[rep], masks[j], TITLE_SIMILARITY_THRESHOLD)
+            if score > TITLE_SIMILARITY_THRESHOLD:
+                if candidate.confidence > current.confidence:
+                    rep = j  # the merge keeps candidate's title
+                current = _merge_events(current, candidate)
                 used.add(j)
 
         merged.append(current)
         used.add(i)
+        needs_resort = needs_resort or rep != i
 
-    return sorted(merged, key=lambda e: e.timestamp_seconds)
+    # A merge that keeps a later event's timestamp can put the cluster out of
+    # order; only then is a second sort needed.
+    if needs_resort:
+        merged.sort(key=lambda e: e.timestamp_seconds)
+    return merged
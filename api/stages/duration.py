@@ -0,0 +1,160 @@
+"""Stage 1 — Read video duration straight from the container header.
+
+MP4/MOV store the duration in the ``moov/mvhd`` box and WebM in
+``Segment/Info/Duration``, both a few KB into a well-formed file. Reading
+them directly avoids spawning ffprobe for every upload.
+"""
+
+import mmap
+import os
+import struct
+from functools import lru_cache
+from typing import Iterator, Optional
+
+# EBML element IDs (WebM / Matroska)
+_EBML_HEADER = 0x1A45DFA3
+_SEGMENT = 0x18538067
+_INFO = 0x1549A966
+_TIMECODE_SCALE = 0x2AD7B1
+_DURATION = 0x4489
+
+_DEFAULT_TIMECODE_SCALE = 1_000_000  # nanoseconds per tick
+
+
+def iter_boxes(buf: bytes | mmap.mmap, start: int, end: int) -> Iterator[tuple[bytes, int, int]]:
+    """Yield (type, payload_start, payload_end) for ISO-BMFF boxes in [start, end)."""
+    pos = start
+    while pos + 8 <= end:
+        size, box_type = struct.unpack_from(">I4s", buf, pos)
+        header = 8
+        if size == 1:
+            size = struct.unpack_from(">Q", buf, pos + 8)[0]
+            header = 16
+        elif size == 0:
+            size = end - pos
+        if size < header:
+            raise ValueError(f"Malformed box {box_type!r}")
+        yield box_type, pos + header, min(pos + size, end)
+        pos += size
+
+
+def _find_box(buf: mmap.mmap, start: int, end: int, box_type: bytes) -> Optional[tuple[int, int]]:
+    for found, payload_start, payload_end in iter_boxes(buf, start, end):
+        if found == box_type:
+            return payload_start, payload_end
+    return None
+
+
+def probe_duration_mp4(buf: mmap.mmap) -> Optional[float]:
+    """Return the duration in seconds from ``moov/mvhd``, or None if absent."""
+    moov = _find_box(buf, 0, len(buf), b"moov")
+    if moov is None:
+        return None
+    mvhd = _find_box(buf, moov[0], moov[1], b"mvhd")
+    if mvhd is None:
+        return None
+
+    start = mvhd[0]
+    version = buf[start]
+    if version == 1:
+        timescale, duration = struct.unpack_from(">IQ", buf, start + 20)
+        unknown = 0xFFFFFFFFFFFFFFFF
+    else:
+        timescale, duration = struct.unpack_from(">II", buf, start + 12)
+        unknown = 0xFFFFFFFF
+
+    if timescale == 0 or duration == unknown:
+        return None
+    return duration / timescale
+
+
+def _read_vint(buf: mmap.mmap, pos: int, keep_marker: bool) -> tuple[int, int]:
+    """Read an EBML variable-length integer. Returns (value, length)."""
+    first = buf[pos]
+    length = 1
+    mask = 0x80
+    while length <= 8 and not first & mask:
+        mask >>= 1
+        length += 1
+    if length > 8:
+        raise ValueError("Invalid EBML vint")
+    value = first if keep_marker else first & (mask - 1)
+    for i in range(1, length):
+        value = (value << 8) | buf[pos + i]
+    return value, length
+
+
+def _iter_elements(buf: mmap.mmap, start: int, end: int) -> Iterator[tuple[int, int, Optional[int]]]:
+    """Yield (id, payload_start, payload_end) for EBML elements in [start, end).
+
+    payload_end is None when the element declares an unknown size.
+    """
+    pos = start
+    while pos < end:
+        element_id, id_len = _read_vint(buf, pos, keep_marker=True)
+        size, size_len = _read_vint(buf, pos + id_len, keep_marker=False)
+        payload_start = pos + id_len + size_len
+        if size == (1 << (7 * size_len)) - 1:
+            yield element_id, payload_start, None
+            return
+        yield element_id, payload_start, payload_start + size
+        pos = payload_start + size
+
+
+def probe_duration_webm(buf: mmap.mmap) -> Optional[float]:
+    """Return the duration in seconds from ``Segment/Info``, or None if absent."""
+    for element_id, seg_start, seg_end in _iter_elements(buf, 0, len(buf)):
+        if element_id != _SEGMENT:
+            continue
+        for child_id, info_start, info_end in _iter_elements(buf, seg_start, seg_end or len(buf)):
+            if info_end is None:
+                return None
+            if child_id != _INFO:
+                continue
+
+            scale = _DEFAULT_TIMECODE_SCALE
+            duration: Optional[float] = None
+            for field_id, start, end in _iter_elements(buf, info_start, info_end):
+                if end is None:
+                    break
+                if field_id == _TIMECODE_SCALE:
+                    scale = int.from_bytes(buf[start:end], "big")
+                elif field_id == _DURATION:
+                    fmt = ">f" if end - start == 4 else ">d"
+                    duration = struct.unpack_from(fmt, buf, start)[0]
+
+            if duration is None:
+                return None
+            return duration * scale / 1e9
+    return None
+
+
+@lru_cache(maxsize=128)
+def _probe_cached(path: str, size: int, mtime_ns: int) -> Optional[float]:
+    with open(path, "rb") as f:
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as buf:
+            if buf[:4] == _EBML_HEADER.to_bytes(4, "big"):
+                return probe_duration_webm(buf)
+            return probe_duration_mp4(buf)
+
+
+def probe_duration(path: str) -> Optional[float]:
+    """Read a video's duration in seconds without spawning a subprocess.
+
+    Results are memoized on (path, size, mtime) so re-probing the same file
+    is free.
+
+    Args:
+        path: Path to an mp4, mov, or webm file.
+
+    Returns:
+        Duration in seconds, or None if the header could not be parsed
+        (the limit is then enforced during audio extraction).
+    """
+    try:
+        st = os.stat(path)
+        if st.st_size == 0:
+            return None
+        return _probe_cached(path, st.st_size, st.st_mtime_ns)
+    except (OSError, ValueError, IndexError, struct.error):
+        return None
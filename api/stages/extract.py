@@ -1,44 +1,30 @@
 """Stage 4 — LLM extraction of failure events from transcript windows."""
 
+import asyncio
 import json
 import logging
 import os
+import threading
+import time
+from functools import lru_cache
 from pathlib import Path
+from typing import Optional
 
+import orjson
+
+from clients import aclose_async_openai_client, get_async_openai_client, get_openai_client
 from models import FailureEvent, TranscriptSegment
+from stages.prompts import MULTI_WINDOW_PROMPT, REPAIR_PROMPT, REPAIR_PROMPT_MULTI, SYSTEM_PROMPT
 
 logger = logging.getLogger(__name__)
 
 FIXTURES_DIR = Path(__file__).resolve().parent.parent / "fixtures"
 
-SYSTEM_PROMPT = """\
-You are a QA analysis assistant. You are given a window of timestamped transcript \
-segments from a narrated screen recording. The narrator is describing what they see \
-on screen and may mention bugs, errors, or unexpected behavior.
-
-Your job: identify any software failure events described in this transcript window.
-
-For each failure, output a JSON object with these exact fields:
-- timestamp_seconds (float): the start time of the segment where the failure is described
-- title (string): a short title summarizing the failure (max 10 words)
-- expected (string): what should have happened
-- actual (string): what actually happened
-- evidence (string): exact quote(s) from the transcript that support this failure
-- confidence (float 0-1): how confident you are this is a real software failure
+OPENAI_MODEL = "gpt-4o-mini"
 
-Rules:
-- Output ONLY a JSON array of failure objects. No markdown, no explanation.
-- If no failures are found, output an empty array: []
-- The evidence field MUST contain actual text from the provided transcript segments.
-- Do not invent failures not supported by the transcript.
-- A failure is a software bug, UI issue, or unexpected behavior — NOT user confusion or feature requests.
-"""
-
-REPAIR_PROMPT = """\
-Your previous response was not valid JSON. Please output ONLY a valid JSON array \
-of failure event objects (or [] if none). No markdown fences, no explanation, \
-just the raw JSON array.
-"""
+# Completion budget per window, and the most OPENAI_MODEL can return per request
+WINDOW_MAX_TOKENS = 2000
+OPENAI_MAX_COMPLETION_TOKENS = 16384
 
 
 def _is_mock_mode() -> bool:
@@ -50,17 +36,90 @@ def _get_extract_provider() -> str:
     return os.environ.get("EXTRACT_PROVIDER", "openai").strip().lower()
 
 
-def _mock_extract_fixtures(window: list[TranscriptSegment]) -> list[FailureEvent]:
-    """Return failures from fixtures that overlap the given window's time range."""
+def _get_extract_mode() -> str:
+    """Get extraction mode from env: 'realtime' (default) or 'batch_api'."""
+    return os.environ.get("EXTRACT_MODE", "realtime").strip().lower()
+
+
+@lru_cache(maxsize=1)
+def _load_fixture_failures() -> tuple[FailureEvent, ...]:
+    """Load fixtures/failures.json once; every mock window filters the same list."""
     fixture_path = FIXTURES_DIR / "failures.json"
-    with open(fixture_path) as f:
-        all_failures = [FailureEvent(**item) for item in json.load(f)]
+    return tuple(FailureEvent(**item) for item in orjson.loads(fixture_path.read_bytes()))
+
+
+def _windows_per_call() -> int:
+    """Windows packed into a single OpenAI request (default 1 = one request per window).
+
+    Capped so every window in a group still gets WINDOW_MAX_TOKENS of output.
+    """
+    requested = max(1, int(os.environ.get("KADO_WINDOWS_PER_CALL", "1")))
+    return min(requested, OPENAI_MAX_COMPLETION_TOKENS // WINDOW_MAX_TOKENS)
+
+
+class _TokenBucket:
+    """Token-bucket rate limiter shared by threads and coroutines.
+
+    Each acquire reserves a token up front and returns after however long it
+    takes the bucket to refill to that reservation, so concurrent callers
+    queue up instead of all retrying at once.
+    """
+
+    def __init__(self, per_minute: float, burst: int):
+        self.rate = per_minute / 60.0
+        self.capacity = float(burst)
+        self.tokens = float(burst)
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _reserve(self) -> float:
+        """Take a token and return the seconds to wait before using it."""
+        with self._lock:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            self.tokens -= 1
+            return max(0.0, -self.tokens / self.rate)
+
+    def acquire(self) -> None:
+        time.sleep(self._reserve())
 
+    async def acquire_async(self) -> None:
+        await asyncio.sleep(self._reserve())
+
+
+@lru_cache(maxsize=1)
+def _token_bucket(per_minute: float) -> _TokenBucket:
+    return _TokenBucket(per_minute, burst=max(1, int(per_minute // 60)))
+
+
+def _rate_limiter():
+    """Process-wide limiter for LLM requests, or None when KADO_LLM_RPM is unset/0."""
+    per_minute = float(os.environ.get("KADO_LLM_RPM", "0"))
+    return _token_bucket(per_minute) if per_minute > 0 else None
+
+
+def _throttle() -> None:
+    """Wait for a KADO_LLM_RPM token; called right before every LLM request."""
+    limiter = _rate_limiter()
+    if limiter is not None:
+        limiter.acquire()
+
+
+async def _athrottle() -> None:
+    """_throttle for coroutines."""
+    limiter = _rate_limiter()
+    if limiter is not None:
+        await limiter.acquire_async()
+
+
+def _mock_extract_fixtures(window: list[TranscriptSegment]) -> list[FailureEvent]:
+    """Return failures from fixtures that overlap the given window's time range."""
     window_start = min(seg.start for seg in window)
     window_end = max(seg.end for seg in window)
 
     return [
-        f for f in all_failures
+        f for f in _load_fixture_failures()
         if window_start <= f.timestamp_seconds <= window_end
     ]
 
@@ -82,18 +141,19 @@ def _mock_extract_deterministic(window: list[TranscriptSegment]) -> list[Failure
     
     # Collect all text for context
     full_text = " ".join(seg.text for seg in window)
+    text_lower = full_text.lower()
     
     # Generate a simple failure based on text content
     title = f"Issue detected at {timestamp:.1f}s"
     
     # Simple heuristics for expected/actual based on common patterns
-    if "doesn't" in full_text.lower() or "does not" in full_text.lower():
+    if "doesn't" in text_lower or "does not" in text_lower:
         expected = "Feature should work as intended"
         actual = "Feature is not working"
-    elif "error" in full_text.lower() or "bug" in full_text.lower():
+    elif "error" in text_lower or "bug" in text_lower:
         expected = "No errors should occur"
         actual = "Error or bug encountered"
-    elif "broken" in full_text.lower() or "crash" in full_text.lower():
+    elif "broken" in text_lower or "crash" in text_lower:
         expected = "Application should remain stable"
         actual = "Application is broken or crashed"
     else:
@@ -119,75 +179,186 @@ def _mock_extract_deterministic(window: list[TranscriptSegment]) -> list[Failure
 
 def _format_window(window: list[TranscriptSegment]) -> str:
     """Format a window of segments for the LLM prompt."""
-    lines = []
-    for seg in window:
-        lines.append(f"[{seg.start:.1f}s - {seg.end:.1f}s] {seg.text}")
-    return "\n".join(lines)
+    return "\n".join(f"[{seg.start:.1f}s - {seg.end:.1f}s] {seg.text}" for seg in window)
 
 
-def _parse_failures(text: str) -> list[FailureEvent]:
-    """Parse LLM response text into FailureEvent objects.
+def _format_windows_multi(windows: list[list[TranscriptSegment]]) -> str:
+    """Format several windows for one LLM prompt, each under a numbered header."""
+    return "\n\n".join(
+        f"--- WINDOW {i} ---\n{_format_window(window)}"
+        for i, window in enumerate(windows, start=1)
+    )
 
-    Raises ValueError if JSON is invalid.
-    """
-    # Strip markdown fences if present
+
+def _load_json_array(text: str) -> list:
+    """Decode an LLM reply that should be a JSON array, tolerating markdown fences."""
+    # Strip markdown fences if present: drop the ```lang line and the closing ```
     cleaned = text.strip()
     if cleaned.startswith("```"):
-        lines = cleaned.split("\n")
-        # Remove first and last lines (fences)
-        lines = [l for l in lines if not l.strip().startswith("```")]
-        cleaned = "\n".join(lines)
+        cleaned = cleaned.partition("\n")[2].removesuffix("```")
 
-    data = json.loads(cleaned)
+    data = orjson.loads(cleaned)
     if not isinstance(data, list):
         raise ValueError("Expected a JSON array")
+    return data
 
-    return [FailureEvent(**item) for item in data]
 
+def _parse_failures(text: str) -> list[FailureEvent]:
+    """Parse LLM response text into FailureEvent objects.
+
+    Raises ValueError if JSON is invalid.
+    """
+    return [FailureEvent(**item) for item in _load_json_array(text)]
+
+
+def _parse_failures_multi(text: str, num_windows: int) -> list[list[FailureEvent]]:
+    """Parse a multi-window reply into one list of FailureEvents per window.
+
+    Raises ValueError if JSON is invalid or doesn't have one array per window.
+    """
+    data = _load_json_array(text)
+    if len(data) != num_windows or not all(isinstance(item, list) for item in data):
+        raise ValueError(f"Expected an array of {num_windows} arrays")
+    return [[FailureEvent(**item) for item in window] for window in data]
+
+
+# Errors that mean a reply wasn't the JSON we asked for
+_PARSE_ERRORS = (json.JSONDecodeError, ValueError, KeyError, TypeError)
 
-def _extract_openai(window: list[TranscriptSegment]) -> list[FailureEvent]:
-    """Extract failures using OpenAI GPT-4o-mini."""
-    from openai import OpenAI
 
-    client = OpenAI(api_key=os.environ["OPENAI_API_KEY"])
-    user_content = _format_window(window)
+def _openai_attempts(
+    system_prompt: str,
+    user_content: str,
+    repair_prompt: str,
+    parse,
+    max_tokens: int = WINDOW_MAX_TOKENS,
+):
+    """The first attempt and repair retry of an OpenAI chat extraction.
 
+    A generator: it yields the kwargs for each chat.completions.create call
+    and is sent back the reply text. It returns parse(reply) for the first
+    reply that parses, or None if the repaired reply doesn't parse either.
+    Sync and async callers differ only in how they make the call.
+    """
     messages = [
-        {"role": "system", "content": SYSTEM_PROMPT},
+        {"role": "system", "content": system_prompt},
         {"role": "user", "content": user_content},
     ]
 
     # First attempt
-    response = client.chat.completions.create(
-        model="gpt-4o-mini",
-        messages=messages,
-        temperature=0.1,
-        max_tokens=2000,
-    )
-    first_reply = response.choices[0].message.content or ""
-
+    first_reply = yield dict(model=OPENAI_MODEL, messages=messages, temperature=0.1, max_tokens=max_tokens)
     try:
-        return _parse_failures(first_reply)
-    except (json.JSONDecodeError, ValueError, KeyError):
+        return parse(first_reply)
+    except _PARSE_ERRORS:
         pass
 
     # Retry with repair prompt
     messages.append({"role": "assistant", "content": first_reply})
-    messages.append({"role": "user", "content": REPAIR_PROMPT})
+    messages.append({"role": "user", "content": repair_prompt})
+    second_reply = yield dict(model=OPENAI_MODEL, messages=messages, temperature=0.0, max_tokens=max_tokens)
+    try:
+        return parse(second_reply)
+    except _PARSE_ERRORS:
+        return None
 
-    response = client.chat.completions.create(
-        model="gpt-4o-mini",
-        messages=messages,
-        temperature=0.0,
-        max_tokens=2000,
-    )
-    second_reply = response.choices[0].message.content or ""
 
+def _gemini_attempts(user_content: str):
+    """_openai_attempts for Gemini, which takes a single prompt string per call."""
+    # Combine system + user into single prompt for Gemini
+    full_prompt = f"{SYSTEM_PROMPT}\n\nTranscript window:\n{user_content}"
+
+    first_reply = yield full_prompt
+    try:
+        return _parse_failures(first_reply)
+    except _PARSE_ERRORS:
+        pass
+
+    second_reply = yield f"{full_prompt}\n\nYour previous response was not valid JSON. {REPAIR_PROMPT}"
     try:
         return _parse_failures(second_reply)
-    except (json.JSONDecodeError, ValueError, KeyError):
-        # Both attempts failed — skip this window
-        return []
+    except _PARSE_ERRORS:
+        return None
+
+
+def _converse(attempts, send):
+    """Run an attempts generator, making each request with send(request) -> reply text."""
+    request = next(attempts)
+    while True:
+        try:
+            request = attempts.send(send(request))
+        except StopIteration as done:
+            return done.value
+
+
+async def _aconverse(attempts, send):
+    """_converse for a coroutine send."""
+    request = next(attempts)
+    while True:
+        try:
+            request = attempts.send(await send(request))
+        except StopIteration as done:
+            return done.value
+
+
+def _extract_openai(window: list[TranscriptSegment], client=None) -> list[FailureEvent]:
+    """Extract failures using OpenAI GPT-4o-mini.
+
+    Args:
+        window: Transcript segments to analyze.
+        client: OpenAI client to use; defaults to the shared one.
+    """
+    client = client or get_openai_client()
+
+    def send(request: dict) -> str:
+        _throttle()
+        return client.chat.completions.create(**request).choices[0].message.content or ""
+
+    attempts = _openai_attempts(SYSTEM_PROMPT, _format_window(window), REPAIR_PROMPT, _parse_failures)
+    # Both attempts failed — skip this window
+    return _converse(attempts, send) or []
+
+
+async def _extract_openai_async(window: list[TranscriptSegment], client=None) -> list[FailureEvent]:
+    """Async variant of _extract_openai, so windows can be extracted concurrently."""
+    client = client or get_async_openai_client()
+
+    async def send(request: dict) -> str:
+        await _athrottle()
+        response = await client.chat.completions.create(**request)
+        return response.choices[0].message.content or ""
+
+    attempts = _openai_attempts(SYSTEM_PROMPT, _format_window(window), REPAIR_PROMPT, _parse_failures)
+    return await _aconverse(attempts, send) or []
+
+
+async def _extract_openai_multi_async(
+    windows: list[list[TranscriptSegment]],
+    client=None,
+) -> Optional[list[list[FailureEvent]]]:
+    """Extract failures for several windows with a single OpenAI request.
+
+    The system prompt and round trip are paid once per group instead of once
+    per window.
+
+    Returns:
+        One list of failures per window, or None if neither attempt yields
+        one array per window (the caller then extracts them one by one).
+    """
+    client = client or get_async_openai_client()
+
+    async def send(request: dict) -> str:
+        await _athrottle()
+        response = await client.chat.completions.create(**request)
+        return response.choices[0].message.content or ""
+
+    attempts = _openai_attempts(
+        MULTI_WINDOW_PROMPT,
+        _format_windows_multi(windows),
+        REPAIR_PROMPT_MULTI,
+        lambda reply: _parse_failures_multi(reply, len(windows)),
+        max_tokens=min(WINDOW_MAX_TOKENS * len(windows), OPENAI_MAX_COMPLETION_TOKENS),
+    )
+    return await _aconverse(attempts, send)
 
 
 def _extract_ollama(window: list[TranscriptSegment]) -> list[FailureEvent]:
@@ -200,55 +371,56 @@ def _extract_ollama(window: list[TranscriptSegment]) -> list[FailureEvent]:
     return []
 
 
-def _extract_with_gemini(window: list[TranscriptSegment]) -> list[FailureEvent]:
-    """Extract failures using Google Gemini API.
-    
-    Uses same JSON parsing + retry strategy as OpenAI.
-    Requires GEMINI_API_KEY environment variable.
+def _gemini_model():
+    """Configure the Gemini SDK from env and return the GEMINI_MODEL model.
+
+    Raises:
+        ValueError: If GEMINI_API_KEY is not set.
     """
     import google.generativeai as genai
-    
+
     api_key = os.environ.get("GEMINI_API_KEY")
     if not api_key:
         raise ValueError("GEMINI_API_KEY is not set")
-    
+
     genai.configure(api_key=api_key)
+    return genai.GenerativeModel(os.environ.get("GEMINI_MODEL", "gemini-1.5-flash"))
+
+
+def _extract_with_gemini(window: list[TranscriptSegment]) -> list[FailureEvent]:
+    """Extract failures using Google Gemini API.
     
-    model_name = os.environ.get("GEMINI_MODEL", "gemini-1.5-flash")
-    model = genai.GenerativeModel(model_name)
-    
-    user_content = _format_window(window)
-    
-    # Combine system + user into single prompt for Gemini
-    full_prompt = f"{SYSTEM_PROMPT}\n\nTranscript window:\n{user_content}"
-    
-    # First attempt
-    try:
-        response = model.generate_content(full_prompt)
-        first_reply = response.text if response.text else ""
-        
+    Uses same JSON parsing + retry strategy as OpenAI.
+    Requires GEMINI_API_KEY environment variable.
+    """
+    model = _gemini_model()
+
+    def send(prompt: str) -> str:
+        _throttle()
+        # A failed request counts as an unparseable reply
         try:
-            return _parse_failures(first_reply)
-        except (json.JSONDecodeError, ValueError, KeyError):
-            pass
-    except Exception as e:
-        logger.warning("Gemini first attempt failed: %s", str(e))
-    
-    # Retry with repair prompt
-    repair_full_prompt = f"{full_prompt}\n\nYour previous response was not valid JSON. {REPAIR_PROMPT}"
-    
-    try:
-        response = model.generate_content(repair_full_prompt)
-        second_reply = response.text if response.text else ""
-        
+            return model.generate_content(prompt).text or ""
+        except Exception as e:
+            logger.warning("Gemini request failed: %s", str(e))
+            return ""
+
+    # Both attempts failed — skip this window
+    return _converse(_gemini_attempts(_format_window(window)), send) or []
+
+
+async def _extract_with_gemini_async(window: list[TranscriptSegment]) -> list[FailureEvent]:
+    """Async variant of _extract_with_gemini, so windows can be extracted concurrently."""
+    model = _gemini_model()
+
+    async def send(prompt: str) -> str:
+        await _athrottle()
         try:
-            return _parse_failures(second_reply)
-        except (json.JSONDecodeError, ValueError, KeyError):
-            # Both attempts failed — skip this window
-            return []
-    except Exception as e:
-        logger.warning("Gemini retry failed: %s", str(e))
-        return []
+            return (await model.generate_content_async(prompt)).text or ""
+        except Exception as e:
+            logger.warning("Gemini request failed: %s", str(e))
+            return ""
+
+    return await _aconverse(_gemini_attempts(_format_window(window)), send) or []
 
 
 def extract_failures(window: list[TranscriptSegment]) -> list[FailureEvent]:
@@ -268,7 +440,7 @@ def extract_failures(window: list[TranscriptSegment]) -> list[FailureEvent]:
         return _mock_extract_fixtures(window)
 
     provider = _get_extract_provider()
-    
+
     if provider == "mock":
         logger.info("Using mock (deterministic) extraction")
         return _mock_extract_deterministic(window)
@@ -283,3 +455,161 @@ def extract_failures(window: list[TranscriptSegment]) -> list[FailureEvent]:
         return _extract_ollama(window)
     else:
         raise ValueError(f"Unknown EXTRACT_PROVIDER: {provider}. Must be 'mock', 'openai', 'gemini', or 'ollama'.")
+
+
+async def aextract_failures(window: list[TranscriptSegment]) -> list[FailureEvent]:
+    """Async variant of extract_failures.
+
+    Network-bound providers (OpenAI, Gemini) use their async clients so the
+    pipeline can run many windows concurrently. Same provider selection and
+    fallbacks as extract_failures.
+    """
+    if _is_mock_mode():
+        return _mock_extract_fixtures(window)
+
+    provider = _get_extract_provider()
+
+    if provider == "openai":
+        logger.info("Using OpenAI extraction")
+        return await _extract_openai_async(window)
+    elif provider == "gemini":
+        logger.info("Using Gemini extraction")
+        return await _extract_with_gemini_async(window)
+    return extract_failures(window)
+
+
+async def aextract_failures_batch(
+    windows: list[list[TranscriptSegment]],
+    concurrency: int = 8,
+) -> list[list[FailureEvent]]:
+    """Extract failures from every window in one call.
+
+    Windows are extracted concurrently, at most ``concurrency`` requests at
+    a time. With the OpenAI provider, KADO_WINDOWS_PER_CALL > 1 packs that
+    many consecutive windows into each request.
+    With EXTRACT_MODE=batch_api and the OpenAI provider, all windows are
+    instead submitted as a single OpenAI Batch API job (cheaper, but may
+    take up to 24h). That blocks a thread until the job finishes, so it is
+    only for offline runs through ``python pipeline.py``; /analyze rejects it.
+
+    Args:
+        windows: Transcript windows (segment slices of the build_windows spans).
+        concurrency: Max extraction requests in flight.
+
+    Returns:
+        One list of failures per window, in window order.
+    """
+    if not _is_mock_mode() and _get_extract_mode() == "batch_api":
+        if _get_extract_provider() == "openai":
+            return await asyncio.to_thread(_extract_openai_batch_api, windows)
+        logger.warning("EXTRACT_MODE=batch_api is only supported for OpenAI — extracting in realtime")
+
+    sem = asyncio.Semaphore(concurrency)
+
+    async def _extract(i: int, window: list[TranscriptSegment]) -> list[FailureEvent]:
+        async with sem:
+            logger.info("  Processing window %d/%d", i + 1, len(windows))
+            failures = await aextract_failures(window)
+            logger.info("  → window %d: %d failures found", i + 1, len(failures))
+            return failures
+
+    group_size = _windows_per_call()
+    if group_size > 1 and not _is_mock_mode() and _get_extract_provider() == "openai":
+        groups = [windows[i:i + group_size] for i in range(0, len(windows), group_size)]
+
+        async def _extract_group(i: int, group: list[list[TranscriptSegment]]) -> list[list[FailureEvent]]:
+            async with sem:
+                logger.info("  Processing windows %d-%d/%d", i + 1, i + len(group), len(windows))
+                results = await _extract_openai_multi_async(group)
+            if results is not None:
+                return results
+            # Out of the group's slot, so the per-window requests queue for
+            # their own like any other window
+            logger.warning("Multi-window reply unusable — extracting %d windows one by one", len(group))
+            return list(await asyncio.gather(*(_extract(i + k, w) for k, w in enumerate(group))))
+
+        results = await asyncio.gather(
+            *(_extract_group(g * group_size, group) for g, group in enumerate(groups))
+        )
+        return [failures for group_results in results for failures in group_results]
+
+    return await asyncio.gather(*(_extract(i, w) for i, w in enumerate(windows)))
+
+
+def extract_failures_batch(
+    windows: list[list[TranscriptSegment]],
+    concurrency: int = 8,
+) -> list[list[FailureEvent]]:
+    """Synchronous wrapper around aextract_failures_batch for callers without an event loop."""
+
+    async def run() -> list[list[FailureEvent]]:
+        try:
+            return await aextract_failures_batch(windows, concurrency=concurrency)
+        finally:
+            # The loop ends with this call; don't leave its client's connections behind
+            await aclose_async_openai_client()
+
+    return asyncio.run(run())
+
+
+def _extract_openai_batch_api(windows: list[list[TranscriptSegment]]) -> list[list[FailureEvent]]:
+    """Extract failures for all windows through one OpenAI Batch API job.
+
+    Blocks until the batch finishes, polling every KADO_BATCH_POLL_SECONDS.
+    There is no repair round trip: a window whose reply doesn't parse is
+    skipped, like a window that fails both realtime attempts.
+    """
+    client = get_openai_client()
+    poll_seconds = float(os.environ.get("KADO_BATCH_POLL_SECONDS", "30"))
+
+    lines: list[bytes] = []
+    for i, window in enumerate(windows):
+        request = {
+            "custom_id": f"window-{i}",
+            "method": "POST",
+            "url": "/v1/chat/completions",
+            "body": {
+                "model": OPENAI_MODEL,
+                "messages": [
+                    {"role": "system", "content": SYSTEM_PROMPT},
+                    {"role": "user", "content": _format_window(window)},
+                ],
+                "temperature": 0.1,
+                "max_tokens": WINDOW_MAX_TOKENS,
+            },
+        }
+        lines.append(orjson.dumps(request))
+
+    input_file = client.files.create(
+        file=("windows.jsonl", b"\n".join(lines), "application/jsonl"),
+        purpose="batch",
+    )
+    batch = client.batches.create(
+        input_file_id=input_file.id,
+        endpoint="/v1/chat/completions",
+        completion_window="24h",
+    )
+    logger.info("Submitted batch %s with %d windows", batch.id, len(windows))
+
+    while batch.status not in ("completed", "failed", "expired", "cancelled"):
+        time.sleep(poll_seconds)
+        batch = client.batches.retrieve(batch.id)
+
+    results: list[list[FailureEvent]] = [[] for _ in windows]
+    if batch.status != "completed" or not batch.output_file_id:
+        logger.warning("Batch %s finished with status %s — no failures extracted", batch.id, batch.status)
+        return results
+
+    output = client.files.content(batch.output_file_id).text
+    for line in output.splitlines():
+        if not line.strip():
+            continue
+        item = orjson.loads(line)
+        i = int(item["custom_id"].removeprefix("window-"))
+        try:
+            reply = item["response"]["body"]["choices"][0]["message"]["content"] or ""
+            results[i] = _parse_failures(reply)
+        except (TypeError, json.JSONDecodeError, ValueError, KeyError, IndexError):
+            logger.warning("Skipping window %d: unusable batch response", i)
+
+    return results
@@ -0,0 +1,62 @@
+"""Stage 4 — Prompts for LLM failure extraction."""
+
+SYSTEM_PROMPT = """\
+You are a QA analysis assistant. You are given a window of timestamped transcript \
+segments from a narrated screen recording. The narrator is describing what they see \
+on screen and may mention bugs, errors, or unexpected behavior.
+
+Your job: identify any software failure events described in this transcript window.
+
+For each failure, output a JSON object with these exact fields:
+- timestamp_seconds (float): the start time of the segment where the failure is described
+- title (string): a short title summarizing the failure (max 10 words)
+- expected (string): what should have happened
+- actual (string): what actually happened
+- evidence (string): exact quote(s) from the transcript that support this failure
+- confidence (float 0-1): how confident you are this is a real software failure
+
+Rules:
+- Output ONLY a JSON array of failure objects. No markdown, no explanation.
+- If no failures are found, output an empty array: []
+- The evidence field MUST contain actual text from the provided transcript segments.
+- Do not invent failures not supported by the transcript.
+- A failure is a software bug, UI issue, or unexpected behavior — NOT user confusion or feature requests.
+"""
+
+REPAIR_PROMPT = """\
+Your previous response was not valid JSON. Please output ONLY a valid JSON array \
+of failure event objects (or [] if none). No markdown fences, no explanation, \
+just the raw JSON array.
+"""
+
+MULTI_WINDOW_PROMPT = """\
+You are a QA analysis assistant. You are given several windows of timestamped \
+transcript segments from a narrated screen recording, each introduced by a line \
+"--- WINDOW i ---". The narrator is describing what they see on screen and may \
+mention bugs, errors, or unexpected behavior.
+
+Your job: identify any software failure events described in each window, analyzing \
+every window independently.
+
+For each failure, output a JSON object with these exact fields:
+- timestamp_seconds (float): the start time of the segment where the failure is described
+- title (string): a short title summarizing the failure (max 10 words)
+- expected (string): what should have happened
+- actual (string): what actually happened
+- evidence (string): exact quote(s) from the transcript that support this failure
+- confidence (float 0-1): how confident you are this is a real software failure
+
+Rules:
+- Output ONLY a JSON array with exactly one element per window, in window order. \
+Element i is the array of failure objects for window i. No markdown, no explanation.
+- If a window has no failures, its element is an empty array: []
+- The evidence field MUST contain actual text from that window's transcript segments.
+- Do not invent failures not supported by the transcript.
+- A failure is a software bug, UI issue, or unexpected behavior — NOT user confusion or feature requests.
+"""
+
+REPAIR_PROMPT_MULTI = """\
+Your previous response was not valid JSON. Please output ONLY a valid JSON array \
+containing one array of failure event objects per window, in window order. \
+No markdown fences, no explanation, just the raw JSON.
+"""
@@ -1,16 +1,31 @@
 """Stage 2 — Transcribe audio via OpenAI Whisper API, local faster-whisper, or mock fixtures."""
 
-import json
+import io
 import logging
 import os
+import struct
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
 from pathlib import Path
 
+import orjson
+
+from clients import get_openai_client
 from models import TranscriptSegment
+from stages.audio import SAMPLE_RATE, WAV_BYTES_PER_SECOND
 
 logger = logging.getLogger(__name__)
 
 FIXTURES_DIR = Path(__file__).resolve().parent.parent / "fixtures"
 
+# Chunk boundaries move to the quietest 100 ms frame within this many
+# seconds of the target, so words are rarely cut in half
+_SPLIT_SEARCH_SECONDS = 2.0
+_SPLIT_FRAME_BYTES = WAV_BYTES_PER_SECOND // 10
+
+# The Whisper API rejects uploads larger than this
+WHISPER_API_MAX_BYTES = 25 * 1000 * 1000
+
 
 def _is_mock_mode() -> bool:
     return os.environ.get("MOCK_MODE", "").strip() in ("1", "true", "yes")
@@ -21,24 +36,82 @@ def _get_provider() -> str:
     return os.environ.get("TRANSCRIBE_PROVIDER", "openai").strip().lower()
 
 
+@lru_cache(maxsize=1)
+def _load_fixture_transcript() -> tuple[TranscriptSegment, ...]:
+    fixture_path = FIXTURES_DIR / "transcript.json"
+    return tuple(TranscriptSegment(**seg) for seg in orjson.loads(fixture_path.read_bytes()))
+
+
 def _mock_transcribe() -> list[TranscriptSegment]:
     """Return canned transcript segments from fixtures/transcript.json."""
-    fixture_path = FIXTURES_DIR / "transcript.json"
-    with open(fixture_path) as f:
-        data = json.load(f)
-    return [TranscriptSegment(**seg) for seg in data]
+    return list(_load_fixture_transcript())
 
 
-def _transcribe_local(wav_path: str) -> list[TranscriptSegment]:
-    """Transcribe using local faster-whisper."""
+def _whisper_settings() -> tuple[str, str, str]:
+    """(model size, device, compute type) for faster-whisper, from env.
+
+    Defaults to the base model on CPU. The compute type defaults to int8 on
+    CPU and int8_float16 on CUDA (int8 weights, fp16 activations).
+    """
+    device = os.environ.get("WHISPER_DEVICE", "cpu")
+    default_compute = "int8_float16" if device == "cuda" else "int8"
+    return (
+        os.environ.get("WHISPER_MODEL", "base"),
+        device,
+        os.environ.get("WHISPER_COMPUTE_TYPE", default_compute),
+    )
+
+
+def _whisper_batch_size() -> int:
+    """30 s audio chunks decoded together (default 16; 1 disables batching)."""
+    return max(1, int(os.environ.get("WHISPER_BATCH_SIZE", "16")))
+
+
+@lru_cache(maxsize=1)
+def _whisper_model(model_size: str, device: str, compute_type: str):
     from faster_whisper import WhisperModel
 
-    model_size = os.environ.get("WHISPER_MODEL", "base")
-    logger.info("Loading faster-whisper model: %s", model_size)
-    model = WhisperModel(model_size, device="cpu", compute_type="int8")
+    logger.info("Loading faster-whisper model: %s (%s, %s)", model_size, device, compute_type)
+    return WhisperModel(model_size, device=device, compute_type=compute_type)
+
+
+@lru_cache(maxsize=1)
+def _whisper_batched(model_size: str, device: str, compute_type: str):
+    from faster_whisper import BatchedInferencePipeline
+
+    return BatchedInferencePipeline(model=_whisper_model(model_size, device, compute_type))
+
+
+def get_transcribe_client():
+    """Return the (cached) model or API client for the configured provider.
+
+    Importing and constructing these is slow, so the pipeline calls this
+    while ffmpeg is still running. Returns None when nothing needs loading.
+    """
+    if _is_mock_mode():
+        return None
+
+    provider = _get_provider()
+    if provider == "local":
+        return _whisper_model(*_whisper_settings())
+    elif provider == "openai":
+        return get_openai_client()
+    return None
+
+
+def _transcribe_local(audio: bytes) -> list[TranscriptSegment]:
+    """Transcribe using local faster-whisper."""
+    settings = _whisper_settings()
+    batch_size = _whisper_batch_size()
 
-    logger.info("Transcribing with faster-whisper")
-    segments_iter, info = model.transcribe(wav_path, beam_size=5)
+    if batch_size > 1:
+        logger.info("Transcribing with faster-whisper (batch size %d)", batch_size)
+        segments_iter, info = _whisper_batched(*settings).transcribe(
+            io.BytesIO(audio), beam_size=5, batch_size=batch_size
+        )
+    else:
+        logger.info("Transcribing with faster-whisper")
+        segments_iter, info = _whisper_model(*settings).transcribe(io.BytesIO(audio), beam_size=5)
 
     logger.info("Detected language '%s' with probability %.2f", info.language, info.language_probability)
 
@@ -55,34 +128,112 @@ def _transcribe_local(wav_path: str) -> list[TranscriptSegment]:
     return segments
 
 
-def _transcribe_openai(wav_path: str) -> list[TranscriptSegment]:
-    """Transcribe using OpenAI Whisper API."""
-    from openai import OpenAI
+def _transcribe_chunk_seconds(audio_size: int) -> float:
+    """Target length of audio sent per Whisper API request (0 = whole file).
 
-    client = OpenAI(api_key=os.environ["OPENAI_API_KEY"])
+    Splitting can cut words and loses context at the cuts, so by default the
+    whole file goes in one request unless it is over WHISPER_API_MAX_BYTES.
+    KADO_TRANSCRIBE_CHUNK_SECONDS opts in to smaller concurrent chunks.
+    """
+    chunk_seconds = float(os.environ.get("KADO_TRANSCRIBE_CHUNK_SECONDS", "0"))
+    if chunk_seconds <= 0 and audio_size > WHISPER_API_MAX_BYTES:
+        # Largest chunks that still fit, leaving room for the WAV header and
+        # for a cut moved later to a quiet point
+        return (WHISPER_API_MAX_BYTES - 44) / WAV_BYTES_PER_SECOND - 2 * _SPLIT_SEARCH_SECONDS
+    return chunk_seconds
 
-    with open(wav_path, "rb") as audio_file:
-        response = client.audio.transcriptions.create(
-            model="whisper-1",
-            file=audio_file,
-            response_format="verbose_json",
-            timestamp_granularities=["segment"],
-        )
 
-    segments: list[TranscriptSegment] = []
-    for seg in response.segments:
-        segments.append(
-            TranscriptSegment(
-                start=seg["start"] if isinstance(seg, dict) else seg.start,
-                end=seg["end"] if isinstance(seg, dict) else seg.end,
-                text=(seg["text"] if isinstance(seg, dict) else seg.text).strip(),
-            )
-        )
+def _wav_header(data_size: int) -> bytes:
+    """Canonical 44-byte header for mono 16-bit PCM at SAMPLE_RATE."""
+    return struct.pack(
+        "<4sI4s4sIHHIIHH4sI",
+        b"RIFF", 36 + data_size, b"WAVE",
+        b"fmt ", 16, 1, 1, SAMPLE_RATE, WAV_BYTES_PER_SECOND, 2, 16,
+        b"data", data_size,
+    )
 
-    return segments
+
+def _quietest_frame(pcm: memoryview, start: int, end: int) -> int:
+    """Byte offset of the lowest-energy frame in pcm[start:end]."""
+    best_at, best_energy = start, None
+    for at in range(start, end - _SPLIT_FRAME_BYTES + 1, _SPLIT_FRAME_BYTES):
+        energy = sum(map(abs, pcm[at:at + _SPLIT_FRAME_BYTES].cast("h")))
+        if best_energy is None or energy < best_energy:
+            best_at, best_energy = at, energy
+    return best_at
+
+
+def _split_wav(audio: bytes, chunk_seconds: float) -> list[tuple[float, bytes]]:
+    """Split a mono 16 kHz WAV into ~chunk_seconds pieces at quiet points.
+
+    Returns:
+        (offset_seconds, wav_bytes) for each piece, in order.
+    """
+    data_at = audio.find(b"data", 12)
+    if data_at < 0:
+        return [(0.0, audio)]
+    pcm = memoryview(audio)[data_at + 8:]
+    pcm = pcm[:len(pcm) - len(pcm) % 2]
+
+    chunk_bytes = int(chunk_seconds * SAMPLE_RATE) * 2
+    search_bytes = int(_SPLIT_SEARCH_SECONDS * SAMPLE_RATE) * 2
+    cuts = [0]
+    while len(pcm) - cuts[-1] > chunk_bytes + search_bytes:
+        target = cuts[-1] + chunk_bytes
+        cuts.append(_quietest_frame(pcm, target - search_bytes, target + search_bytes))
+    cuts.append(len(pcm))
+
+    return [
+        (start / WAV_BYTES_PER_SECOND, _wav_header(end - start) + pcm[start:end].tobytes())
+        for start, end in zip(cuts, cuts[1:])
+    ]
+
+
+def _transcribe_openai_chunk(audio: bytes, offset: float) -> list[TranscriptSegment]:
+    """Transcribe one WAV with the Whisper API, shifting timestamps by offset."""
+    client = get_openai_client()
+
+    response = client.audio.transcriptions.create(
+        model="whisper-1",
+        file=("audio.wav", audio, "audio/wav"),
+        response_format="verbose_json",
+        timestamp_granularities=["segment"],
+    )
+
+    # Depending on the SDK version segments are dicts or objects; the
+    # whole response uses one form, so check it once
+    raw = response.segments or []
+    if raw and isinstance(raw[0], dict):
+        return [
+            TranscriptSegment(start=seg["start"] + offset, end=seg["end"] + offset, text=seg["text"].strip())
+            for seg in raw
+        ]
+    return [
+        TranscriptSegment(start=seg.start + offset, end=seg.end + offset, text=seg.text.strip())
+        for seg in raw
+    ]
+
+
+def _transcribe_openai(audio: bytes) -> list[TranscriptSegment]:
+    """Transcribe using OpenAI Whisper API.
+
+    Audio over the API's upload limit, or longer than
+    KADO_TRANSCRIBE_CHUNK_SECONDS when that is set, is split at quiet points
+    and the pieces are transcribed concurrently, then stitched back together
+    with their time offsets.
+    """
+    chunk_seconds = _transcribe_chunk_seconds(len(audio))
+    chunks = _split_wav(audio, chunk_seconds) if chunk_seconds > 0 else [(0.0, audio)]
+    if len(chunks) == 1:
+        return _transcribe_openai_chunk(audio, 0.0)
+
+    logger.info("Transcribing %d chunks concurrently", len(chunks))
+    with ThreadPoolExecutor(max_workers=len(chunks)) as pool:
+        results = pool.map(lambda chunk: _transcribe_openai_chunk(chunk[1], chunk[0]), chunks)
+        return [seg for segments in results for seg in segments]
 
 
-def transcribe(wav_path: str) -> list[TranscriptSegment]:
+def transcribe(audio: bytes) -> list[TranscriptSegment]:
     """Transcribe a WAV file into timestamped segments.
 
     Respects MOCK_MODE and TRANSCRIBE_PROVIDER environment variables.
@@ -91,7 +242,7 @@ def transcribe(wav_path: str) -> list[TranscriptSegment]:
     - TRANSCRIBE_PROVIDER=local: Uses faster-whisper locally
 
     Args:
-        wav_path: Path to a mono 16 kHz WAV file.
+        audio: Contents of a mono 16 kHz WAV file.
 
     Returns:
         Ordered list of TranscriptSegment objects.
@@ -103,9 +254,9 @@ def transcribe(wav_path: str) -> list[TranscriptSegment]:
 
     if provider == "local":
         logger.info("Using local faster-whisper transcription")
-        return _transcribe_local(wav_path)
+        return _transcribe_local(audio)
     elif provider == "openai":
         logger.info("Using OpenAI Whisper API transcription")
-        return _transcribe_openai(wav_path)
+        return _transcribe_openai(audio)
     else:
         raise ValueError(f"Unknown TRANSCRIBE_PROVIDER: {provider}. Must be 'openai' or 'local'.")
@@ -0,0 +1,98 @@
+"""Shared pytest configuration for the API tests."""
+
+import asyncio
+import io
+import os
+import sys
+from typing import Callable, Optional
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+import httpx
+import orjson
+import pytest
+from fastapi import HTTPException, UploadFile
+from fastapi.testclient import TestClient
+
+# Shared by the whole session; see app_factory
+_CLIENT: Optional[TestClient] = None
+
+
+@pytest.fixture(scope="session")
+def upload_request() -> tuple[bytes, dict[str, str]]:
+    """(body, headers) for POST /analyze with a dummy mp4, multipart-encoded once.
+
+    Use as ``client.post("/analyze", content=body, headers=headers)``.
+    """
+    request = httpx.Request(
+        "POST",
+        "http://testserver/analyze",
+        files={"file": ("test.mp4", b"fake video content", "video/mp4")},
+    )
+    return request.read(), {"Content-Type": request.headers["Content-Type"]}
+
+
+@pytest.fixture(autouse=True)
+def _no_result_cache(monkeypatch):
+    """Disable the /analyze result cache so every request runs the pipeline."""
+    monkeypatch.setenv("KADO_RESULT_CACHE_SIZE", "0")
+
+
+@pytest.fixture
+def app_factory(monkeypatch) -> Callable[[dict[str, Optional[str]]], TestClient]:
+    """Return make(env) -> TestClient for main.app with env applied.
+
+    env values are set for the test (None unsets the variable). main reads
+    its settings per request, so every test shares one client and main is
+    never reloaded.
+    """
+
+    def make(env: dict[str, Optional[str]]) -> TestClient:
+        _apply_env(monkeypatch, env)
+        return _client()
+
+    return make
+
+
+def _apply_env(monkeypatch, env: dict[str, Optional[str]]) -> None:
+    for name, value in env.items():
+        if value is None:
+            monkeypatch.delenv(name, raising=False)
+        else:
+            monkeypatch.setenv(name, value)
+
+
+def _client() -> TestClient:
+    global _CLIENT
+    if _CLIENT is None:
+        import main as main_mod
+
+        _CLIENT = TestClient(main_mod.app)
+    return _CLIENT
+
+
+@pytest.fixture
+def analyze_direct(monkeypatch) -> Callable[..., tuple[int, dict]]:
+    """Return call(env, content=..., filename=...) -> (status_code, body).
+
+    Applies env like app_factory, then awaits main.analyze directly,
+    skipping routing, middleware and multipart encoding. Keep at least one
+    TestClient test per file for the full HTTP path.
+    """
+
+    def call(
+        env: dict[str, Optional[str]],
+        content: bytes = b"fake video content",
+        filename: str = "test.mp4",
+    ) -> tuple[int, dict]:
+        import main as main_mod
+
+        _apply_env(monkeypatch, env)
+        upload = UploadFile(file=io.BytesIO(content), filename=filename)
+        try:
+            response = asyncio.run(main_mod.analyze(upload, if_none_match=None))
+        except HTTPException as e:
+            return e.status_code, {"detail": e.detail}
+        return response.status_code, orjson.loads(response.body)
+
+    return call
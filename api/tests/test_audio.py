@@ -0,0 +1,147 @@
+"""Tests for audio extraction from a pipe."""
+
+import asyncio
+import struct
+import sys
+import os
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+import pytest
+
+import stages.audio as audio_mod
+from stages.audio import (
+    WAV_BYTES_PER_SECOND,
+    AudioTooLongError,
+    InvalidVideoError,
+    _finish_wav,
+    can_stream,
+    extract_audio_from_stream,
+)
+
+
+def _piped_wav(seconds: float) -> bytes:
+    """A WAV as ffmpeg writes it to a pipe: both size fields left unset."""
+    data = b"\x01\x00" * int(seconds * WAV_BYTES_PER_SECOND // 2)
+    header = struct.pack(
+        "<4sI4s4sIHHIIHH4sI",
+        b"RIFF", 0xFFFFFFFF, b"WAVE",
+        b"fmt ", 16, 1, 1, 16000, WAV_BYTES_PER_SECOND, 2, 16,
+        b"data", 0xFFFFFFFF,
+    )
+    return header + data
+
+
+def _box(box_type: bytes, payload: bytes = b"") -> bytes:
+    return struct.pack(">I4s", 8 + len(payload), box_type) + payload
+
+
+class TestFinishWav:
+    def test_fills_in_sizes(self):
+        wav = _finish_wav(_piped_wav(1.0), max_duration=None)
+        riff_size, = struct.unpack_from("<I", wav, 4)
+        data_size, = struct.unpack_from("<I", wav, 40)
+        assert riff_size == len(wav) - 8
+        assert data_size == WAV_BYTES_PER_SECOND
+        assert wav[44:] == _piped_wav(1.0)[44:]
+
+    def test_within_limit(self):
+        _finish_wav(_piped_wav(3.0), max_duration=3.0)
+
+    def test_too_long(self):
+        with pytest.raises(AudioTooLongError):
+            _finish_wav(_piped_wav(3.5), max_duration=3.0)
+
+    def test_no_data_chunk(self):
+        with pytest.raises(InvalidVideoError):
+            _finish_wav(b"RIFF\xff\xff\xff\xffWAVE", max_duration=None)
+
+
+class TestCanStream:
+    def test_webm(self):
+        assert can_stream(".webm", b"")
+
+    def test_faststart_mp4(self):
+        head = _box(b"ftyp", b"isom") + _box(b"moov", b"\0" * 32) + _box(b"mdat")
+        assert can_stream(".mp4", head)
+
+    def test_mdat_first(self):
+        head = _box(b"ftyp", b"isom") + _box(b"mdat", b"\0" * 32) + _box(b"moov")
+        assert not can_stream(".mov", head)
+
+    def test_moov_beyond_head(self):
+        # The mdat box is larger than what has been read so far
+        head = _box(b"ftyp", b"isom") + struct.pack(">I4s", 1 << 30, b"mdat")
+        assert not can_stream(".mp4", head)
+
+    def test_not_a_container(self):
+        assert not can_stream(".mp4", os.urandom(64))
+
+
+CHUNK = 1 << 20
+NUM_CHUNKS = 5
+
+
+@pytest.fixture
+def fake_ffmpeg(tmp_path, monkeypatch):
+    """Point FFMPEG at a script that reads stdin, then writes output to stdout.
+
+    Returns the path the script records the number of stdin bytes it read to.
+    With read_bytes set it stops reading after that many bytes, like ffmpeg
+    at the -t cap; otherwise it reads to EOF.
+    """
+    received = tmp_path / "received"
+
+    def install(output: bytes, exit_code: int = 0, read_bytes: int | None = None):
+        out = tmp_path / "out.bin"
+        out.write_bytes(output)
+        reader = f"head -c {read_bytes}" if read_bytes is not None else "cat"
+        script = tmp_path / "ffmpeg"
+        script.write_text(
+            "#!/bin/sh\n"
+            f"{reader} | wc -c | tr -d ' ' > '{received}'\n"
+            f"cat '{out}'\n"
+            "echo 'decode error' >&2\n"
+            f"exit {exit_code}\n"
+        )
+        script.chmod(0o755)
+        monkeypatch.setattr(audio_mod, "FFMPEG", str(script))
+        return received
+
+    return install
+
+
+def _stream(max_duration=None) -> bytes:
+    async def chunks():
+        for i in range(NUM_CHUNKS):
+            yield bytes([i]) * CHUNK
+
+    return asyncio.run(extract_audio_from_stream(chunks(), ".webm", max_duration=max_duration))
+
+
+class TestExtractAudioFromStream:
+    def test_returns_fixed_up_wav(self, fake_ffmpeg):
+        received = fake_ffmpeg(_piped_wav(2.0))
+        wav = _stream(max_duration=300)
+        assert struct.unpack_from("<I", wav, 40)[0] == 2 * WAV_BYTES_PER_SECOND
+        assert int(received.read_text()) == NUM_CHUNKS * CHUNK
+
+    def test_too_long(self, fake_ffmpeg):
+        fake_ffmpeg(_piped_wav(2.0))
+        with pytest.raises(AudioTooLongError):
+            _stream(max_duration=1.0)
+
+    def test_stops_reading_at_cap(self, fake_ffmpeg):
+        fake_ffmpeg(_piped_wav(2.0), read_bytes=CHUNK)
+        with pytest.raises(AudioTooLongError):
+            _stream(max_duration=1.0)
+
+    def test_stops_reading_early(self, fake_ffmpeg):
+        fake_ffmpeg(_piped_wav(2.0), read_bytes=CHUNK)
+        with pytest.raises(InvalidVideoError, match="before its end"):
+            _stream(max_duration=300)
+
+    def test_ffmpeg_failure(self, fake_ffmpeg):
+        fake_ffmpeg(b"", exit_code=1)
+        with pytest.raises(InvalidVideoError, match="decode error"):
+            _stream()
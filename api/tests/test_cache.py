@@ -0,0 +1,90 @@
+"""Tests for the /analyze result cache."""
+
+import sys
+import os
+import stat
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+import pytest
+
+from cache import ResultCache
+
+
+class TestResultCache:
+    def test_get_miss(self):
+        cache = ResultCache(max_size=2)
+        assert cache.get("a") is None
+
+    def test_put_get(self):
+        cache = ResultCache(max_size=2)
+        cache.put("a", {"failures": []})
+        assert cache.get("a") == {"failures": []}
+
+    def test_evicts_least_used(self):
+        cache = ResultCache(max_size=2)
+        cache.put("a", {"v": 1})
+        cache.put("b", {"v": 2})
+        cache.get("a")
+        cache.put("c", {"v": 3})
+        assert cache.get("b") is None
+        assert cache.get("a") == {"v": 1}
+        assert cache.get("c") == {"v": 3}
+
+    def test_disabled(self):
+        cache = ResultCache(max_size=0)
+        cache.put("a", {"v": 1})
+        assert cache.get("a") is None
+
+    def test_persists_to_directory(self, tmp_path):
+        ResultCache(max_size=2, directory=str(tmp_path)).put("a", {"v": 1})
+        assert ResultCache(max_size=2, directory=str(tmp_path)).get("a") == {"v": 1}
+
+    def test_eviction_removes_file(self, tmp_path):
+        cache = ResultCache(max_size=1, directory=str(tmp_path))
+        cache.put("a", {"v": 1})
+        cache.put("b", {"v": 2})
+        assert not (tmp_path / "a.json").exists()
+        assert (tmp_path / "b.json").exists()
+
+    def test_directory_is_private(self, tmp_path):
+        directory = tmp_path / "cache"
+        cache = ResultCache(max_size=2, directory=str(directory))
+        cache.put("a", {"v": 1})
+        assert stat.S_IMODE(directory.stat().st_mode) == 0o700
+        assert stat.S_IMODE((directory / "a.json").stat().st_mode) == 0o600
+
+    def test_existing_directory_tightened(self, tmp_path):
+        directory = tmp_path / "cache"
+        directory.mkdir(mode=0o777)
+        os.chmod(directory, 0o777)
+        ResultCache(max_size=2, directory=str(directory))
+        assert stat.S_IMODE(directory.stat().st_mode) == 0o700
+
+    @pytest.mark.skipif(os.getuid() != 0, reason="needs root to hand the directory to another user")
+    def test_refuses_directory_owned_by_someone_else(self, tmp_path):
+        directory = tmp_path / "cache"
+        directory.mkdir()
+        (directory / "a.json").write_text('{"v": "planted"}')
+        os.chown(directory, os.getuid() + 1, -1)
+        cache = ResultCache(max_size=2, directory=str(directory))
+        assert cache.directory is None
+        assert cache.get("a") is None
+
+    def test_refuses_symlinked_directory(self, tmp_path):
+        target = tmp_path / "elsewhere"
+        target.mkdir()
+        (tmp_path / "cache").symlink_to(target)
+        assert ResultCache(max_size=2, directory=str(tmp_path / "cache")).directory is None
+
+    def test_invalid_entries_are_misses(self, tmp_path):
+        def validate(value: dict) -> dict:
+            if "failures" not in value:
+                raise ValueError("not a result")
+            return value
+
+        (tmp_path / "a.json").write_text('{"v": 1}')
+        (tmp_path / "b.json").write_text('{"failures": []}')
+        cache = ResultCache(max_size=2, directory=str(tmp_path), validate=validate)
+        assert cache.get("a") is None
+        assert cache.get("b") == {"failures": []}
@@ -5,6 +5,8 @@ import os
 
 sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
 
+import pytest
+
 from models import TranscriptSegment
 from stages.candidates import detect_candidates, build_windows, FAILURE_KEYWORDS
 
@@ -43,30 +45,61 @@ class TestDetectCandidates:
         assert result == [0]  # only listed once
 
 
+    def test_regex_fallback_matches_automaton(self, monkeypatch):
+        import stages.candidates as candidates_mod
+
+        segments = [
+            _seg(0, 5, "So I click the button"),
+            _seg(5, 10, "and NOTHING happens"),
+            _seg(10, 15, "a few issues remain"),
+            _seg(15, 20, "It fails with an error"),
+        ]
+        monkeypatch.setattr(candidates_mod, "_FAILURE_AUTOMATON", None)
+        assert detect_candidates(segments) == [1, 2, 3]
+
+        if candidates_mod.ahocorasick is None:
+            pytest.skip("pyahocorasick not installed")
+        monkeypatch.setattr(candidates_mod, "_FAILURE_AUTOMATON", candidates_mod._build_automaton())
+        assert detect_candidates(segments) == [1, 2, 3]
+
+
 class TestBuildWindows:
     def test_basic_window(self):
         segments = [_seg(i, i + 1, f"seg {i}") for i in range(10)]
         windows = build_windows(segments, [5], radius=2)
-        assert len(windows) == 1
-        assert len(windows[0]) == 5  # segments 3,4,5,6,7
-        assert windows[0][0].text == "seg 3"
-        assert windows[0][4].text == "seg 7"
+        assert windows == [(3, 8)]  # segments 3,4,5,6,7
 
     def test_window_at_start(self):
         segments = [_seg(i, i + 1, f"seg {i}") for i in range(10)]
         windows = build_windows(segments, [0], radius=2)
-        assert len(windows) == 1
-        assert len(windows[0]) == 3  # segments 0,1,2
-        assert windows[0][0].text == "seg 0"
+        assert windows == [(0, 3)]  # segments 0,1,2
 
     def test_window_at_end(self):
         segments = [_seg(i, i + 1, f"seg {i}") for i in range(10)]
         windows = build_windows(segments, [9], radius=2)
-        assert len(windows) == 1
-        assert len(windows[0]) == 3  # segments 7,8,9
-        assert windows[0][-1].text == "seg 9"
+        assert windows == [(7, 10)]  # segments 7,8,9
+        start, end = windows[0]
+        assert segments[start:end][-1].text == "seg 9"
 
     def test_multiple_candidates(self):
         segments = [_seg(i, i + 1, f"seg {i}") for i in range(10)]
         windows = build_windows(segments, [2, 7], radius=2)
-        assert len(windows) == 2
+        assert windows == [(0, 5), (5, 10)]
+
+    def test_overlapping_windows_merged(self):
+        segments = [_seg(i, i + 1, f"seg {i}") for i in range(20)]
+        windows = build_windows(segments, [3, 5, 6, 15], radius=2)
+        assert windows == [(1, 9), (13, 18)]
+
+    def test_merged_windows_capped(self):
+        segments = [_seg(i, i + 1, "error") for i in range(40)]
+        windows = build_windows(segments, list(range(40)), radius=2, max_segments=10)
+        assert all(end - start <= 10 for start, end in windows)
+        # Every candidate still lands inside some window
+        assert all(any(start <= i < end for start, end in windows) for i in range(40))
+        assert windows[0] == (0, 10)
+
+    def test_overlapping_windows_kept_when_not_merging(self):
+        segments = [_seg(i, i + 1, f"seg {i}") for i in range(10)]
+        windows = build_windows(segments, [3, 5], radius=2, merge_overlapping=False)
+        assert windows == [(1, 6), (3, 8)]
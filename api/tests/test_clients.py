@@ -0,0 +1,49 @@
+"""Tests for the shared OpenAI client singletons."""
+
+import sys
+import os
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+import asyncio
+
+import pytest
+
+pytest.importorskip("openai")
+
+from clients import aclose_async_openai_client, get_async_openai_client, get_openai_client
+
+
+class TestOpenAIClient:
+    def test_reused_across_calls(self, monkeypatch):
+        monkeypatch.setenv("OPENAI_API_KEY", "sk-test-a")
+        assert get_openai_client() is get_openai_client()
+
+    def test_rebuilt_when_key_changes(self, monkeypatch):
+        monkeypatch.setenv("OPENAI_API_KEY", "sk-test-a")
+        first = get_openai_client()
+        monkeypatch.setenv("OPENAI_API_KEY", "sk-test-b")
+        assert get_openai_client() is not first
+
+    def test_async_client_per_event_loop(self, monkeypatch):
+        monkeypatch.setenv("OPENAI_API_KEY", "sk-test-a")
+
+        async def _pair():
+            return get_async_openai_client(), get_async_openai_client()
+
+        a1, a2 = asyncio.run(_pair())
+        b1, _ = asyncio.run(_pair())
+        assert a1 is a2
+        assert b1 is not a1
+
+    def test_aclose_drops_the_loops_client(self, monkeypatch):
+        monkeypatch.setenv("OPENAI_API_KEY", "sk-test-a")
+
+        async def _close_and_rebuild():
+            first = get_async_openai_client()
+            await aclose_async_openai_client()
+            return first, get_async_openai_client()
+
+        first, second = asyncio.run(_close_and_rebuild())
+        assert first.is_closed()
+        assert second is not first
@@ -5,43 +5,19 @@ import os
 
 sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
 
-import pytest
-from fastapi.testclient import TestClient
+# Mock mode with debug metadata enabled
+MOCK_MODE_WITH_DEBUG = {"MOCK_MODE": "1", "DEBUG": "1", "OPENAI_API_KEY": None}
 
-
-@pytest.fixture
-def _mock_mode_with_debug(monkeypatch):
-    """Enable mock mode and debug mode."""
-    monkeypatch.setenv("MOCK_MODE", "1")
-    monkeypatch.setenv("DEBUG", "1")
-    monkeypatch.delenv("OPENAI_API_KEY", raising=False)
-
-
-@pytest.fixture
-def _mock_mode_no_debug(monkeypatch):
-    """Enable mock mode but disable debug mode."""
-    monkeypatch.setenv("MOCK_MODE", "1")
-    monkeypatch.delenv("DEBUG", raising=False)
-    monkeypatch.delenv("OPENAI_API_KEY", raising=False)
-
-
-def _client():
-    """Create a fresh test client with reloaded modules."""
-    import importlib
-    import main as main_mod
-    importlib.reload(main_mod)
-    return TestClient(main_mod.app)
+# Mock mode with debug metadata disabled
+MOCK_MODE_NO_DEBUG = {"MOCK_MODE": "1", "DEBUG": None, "OPENAI_API_KEY": None}
 
 
 class TestDebugMode:
-    def test_analyze_includes_debug_when_enabled(self, _mock_mode_with_debug):
+    def test_analyze_includes_debug_when_enabled(self, app_factory, upload_request):
         """POST /analyze should include debug metadata when DEBUG=1."""
-        client = _client()
-        dummy = b"fake video content"
-        resp = client.post(
-            "/analyze",
-            files={"file": ("test.mp4", dummy, "video/mp4")},
-        )
+        client = app_factory(MOCK_MODE_WITH_DEBUG)
+        payload, headers = upload_request
+        resp = client.post("/analyze", content=payload, headers=headers)
         assert resp.status_code == 200
         body = resp.json()
         
@@ -63,16 +39,10 @@ class TestDebugMode:
         # In mock mode, should have some segments
         assert debug["num_segments"] > 0
 
-    def test_analyze_excludes_debug_when_disabled(self, _mock_mode_no_debug):
+    def test_analyze_excludes_debug_when_disabled(self, analyze_direct):
         """POST /analyze should NOT include debug metadata when DEBUG is unset."""
-        client = _client()
-        dummy = b"fake video content"
-        resp = client.post(
-            "/analyze",
-            files={"file": ("test.mp4", dummy, "video/mp4")},
-        )
-        assert resp.status_code == 200
-        body = resp.json()
+        status, body = analyze_direct(MOCK_MODE_NO_DEBUG)
+        assert status == 200
         
         # Verify debug field is absent or None
         assert body.get("debug") is None
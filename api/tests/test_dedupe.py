@@ -3,10 +3,18 @@
 import sys
 import os
 
+import pytest
+
 sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
 
 from models import FailureEvent
-from stages.dedupe import merge_and_dedupe, _jaccard_similarity
+from stages.dedupe import (
+    merge_and_dedupe,
+    _jaccard_bits,
+    _jaccard_sets,
+    _jaccard_similarity,
+    _title_bitmasks,
+)
 
 
 def _event(ts: float, title: str, confidence: float = 0.8, evidence: str = "evidence") -> FailureEvent:
@@ -36,6 +44,20 @@ class TestJaccardSimilarity:
         assert _jaccard_similarity("", "") == 1.0
         assert _jaccard_similarity("hello", "") == 0.0
 
+    def test_size_ratio_short_circuit(self):
+        a = frozenset({"button"})
+        b = frozenset({"button", "click", "fails"})
+        assert _jaccard_sets(a, b) == 1 / 3
+        assert _jaccard_sets(a, b, threshold=0.5) == 0.0
+
+    def test_bitmasks_match_sets(self):
+        titles = ["button click fails", "click button fails now", "form error", ""]
+        tokens = [frozenset(t.split()) for t in titles]
+        masks = _title_bitmasks(tokens)
+        for i in range(len(titles)):
+            for j in range(len(titles)):
+                assert _jaccard_bits(masks[i], masks[j]) == _jaccard_sets(tokens[i], tokens[j])
+
 
 class TestMergeAndDedupe:
     def test_no_duplicates(self):
@@ -82,5 +104,28 @@ class TestMergeAndDedupe:
         result = merge_and_dedupe(events)
         assert [e.timestamp_seconds for e in result] == [10, 30, 50]
 
+    def test_sorted_after_merge_keeps_later_timestamp(self):
+        events = [
+            _event(10, "Button click fails", confidence=0.5),
+            _event(12, "Form error"),
+            _event(20, "Button click fails", confidence=0.9),
+        ]
+        result = merge_and_dedupe(events)
+        assert [e.timestamp_seconds for e in result] == [12, 20]
+
     def test_empty_input(self):
         assert merge_and_dedupe([]) == []
+
+    def test_vectorized_matches_scalar(self, monkeypatch):
+        import stages.dedupe as dedupe_mod
+
+        pytest.importorskip("numpy")
+        titles = ["Button click fails", "click button fails", "Form error", "form error shown", ""]
+        events = [
+            _event(i * 7, titles[i % len(titles)], confidence=(i % 10) / 10, evidence=f"e{i}")
+            for i in range(80)
+        ]
+        monkeypatch.setattr(dedupe_mod, "VECTORIZE_MIN_EVENTS", 10**9)
+        scalar = merge_and_dedupe(events)
+        monkeypatch.setattr(dedupe_mod, "VECTORIZE_MIN_EVENTS", 0)
+        assert merge_and_dedupe(events) == scalar
@@ -0,0 +1,79 @@
+"""Tests for reading video duration from container headers."""
+
+import sys
+import os
+import struct
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from stages.duration import probe_duration
+
+
+def _box(box_type: bytes, payload: bytes) -> bytes:
+    return struct.pack(">I4s", 8 + len(payload), box_type) + payload
+
+
+def _mvhd_v0(timescale: int, duration: int) -> bytes:
+    # version + flags, creation, modification, timescale, duration
+    return _box(b"mvhd", struct.pack(">B3xIIII", 0, 0, 0, timescale, duration) + b"\0" * 80)
+
+
+def _mvhd_v1(timescale: int, duration: int) -> bytes:
+    return _box(b"mvhd", struct.pack(">B3xQQIQ", 1, 0, 0, timescale, duration) + b"\0" * 80)
+
+
+def _ebml(element_id: int, payload: bytes) -> bytes:
+    # 8-byte size vint: marker 0x01 followed by 7 bytes of length
+    id_bytes = element_id.to_bytes((element_id.bit_length() + 7) // 8, "big")
+    return id_bytes + bytes([0x01]) + len(payload).to_bytes(7, "big") + payload
+
+
+def _write(tmp_path, name: str, data: bytes) -> str:
+    path = tmp_path / name
+    path.write_bytes(data)
+    return str(path)
+
+
+class TestProbeDurationMp4:
+    def test_mvhd_version_0(self, tmp_path):
+        data = _box(b"ftyp", b"isom\0\0\0\0") + _box(b"moov", _mvhd_v0(1000, 12500))
+        assert probe_duration(_write(tmp_path, "a.mp4", data)) == 12.5
+
+    def test_mvhd_version_1(self, tmp_path):
+        data = _box(b"ftyp", b"isom\0\0\0\0") + _box(b"moov", _mvhd_v1(600, 600 * 90))
+        assert probe_duration(_write(tmp_path, "a.mov", data)) == 90.0
+
+    def test_moov_after_mdat(self, tmp_path):
+        data = (
+            _box(b"ftyp", b"isom\0\0\0\0")
+            + _box(b"mdat", b"\0" * 4096)
+            + _box(b"moov", _mvhd_v0(44100, 44100 * 3))
+        )
+        assert probe_duration(_write(tmp_path, "a.mp4", data)) == 3.0
+
+    def test_missing_moov(self, tmp_path):
+        data = _box(b"ftyp", b"isom\0\0\0\0")
+        assert probe_duration(_write(tmp_path, "a.mp4", data)) is None
+
+
+class TestProbeDurationWebm:
+    def test_info_duration(self, tmp_path):
+        info = _ebml(0x2AD7B1, (1_000_000).to_bytes(3, "big")) + _ebml(0x4489, struct.pack(">d", 42000.0))
+        data = _ebml(0x1A45DFA3, b"") + _ebml(0x18538067, _ebml(0x1549A966, info))
+        assert probe_duration(_write(tmp_path, "a.webm", data)) == 42.0
+
+    def test_missing_duration(self, tmp_path):
+        info = _ebml(0x2AD7B1, (1_000_000).to_bytes(3, "big"))
+        data = _ebml(0x1A45DFA3, b"") + _ebml(0x18538067, _ebml(0x1549A966, info))
+        assert probe_duration(_write(tmp_path, "a.webm", data)) is None
+
+
+class TestProbeDurationInvalid:
+    def test_garbage(self, tmp_path):
+        assert probe_duration(_write(tmp_path, "a.mp4", b"fake video content")) is None
+
+    def test_empty(self, tmp_path):
+        assert probe_duration(_write(tmp_path, "a.mp4", b"")) is None
+
+    def test_missing_file(self, tmp_path):
+        assert probe_duration(str(tmp_path / "nope.mp4")) is None
@@ -0,0 +1,226 @@
+"""Tests for the LLM extraction stage."""
+
+import asyncio
+import sys
+import os
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from types import SimpleNamespace
+
+import pytest
+
+from models import TranscriptSegment
+from stages.extract import (
+    _TokenBucket,
+    _extract_openai,
+    _extract_openai_async,
+    _converse,
+    _format_windows_multi,
+    _gemini_attempts,
+    _parse_failures,
+    _parse_failures_multi,
+    extract_failures_batch,
+)
+
+
+class _FakeCompletions:
+    """Stands in for client.chat.completions, replying with canned strings."""
+
+    def __init__(self, replies: list[str]):
+        self.replies = list(replies)
+        self.calls = []
+
+    def create(self, **kwargs):
+        self.calls.append(kwargs)
+        message = SimpleNamespace(content=self.replies.pop(0))
+        return SimpleNamespace(choices=[SimpleNamespace(message=message)])
+
+
+class _FakeAsyncCompletions(_FakeCompletions):
+    async def create(self, **kwargs):
+        return _FakeCompletions.create(self, **kwargs)
+
+
+def _fake_client(replies: list[str]):
+    return SimpleNamespace(chat=SimpleNamespace(completions=_FakeCompletions(replies)))
+
+
+def _fake_async_client(replies: list[str]):
+    return SimpleNamespace(chat=SimpleNamespace(completions=_FakeAsyncCompletions(replies)))
+
+
+def _seg(start: float, end: float, text: str) -> TranscriptSegment:
+    return TranscriptSegment(start=start, end=end, text=text)
+
+
+@pytest.fixture
+def _mock_provider(monkeypatch):
+    monkeypatch.delenv("MOCK_MODE", raising=False)
+    monkeypatch.setenv("EXTRACT_PROVIDER", "mock")
+
+
+class TestExtractFailuresBatch:
+    def test_one_result_per_window_in_order(self, _mock_provider):
+        windows = [
+            [_seg(0, 5, "the button is broken")],
+            [_seg(40, 45, "I get an error")],
+            [_seg(90, 95, "it does not save")],
+        ]
+        results = extract_failures_batch(windows, concurrency=2)
+        assert [r[0].timestamp_seconds for r in results] == [0, 40, 90]
+
+    def test_batch_api_mode_ignored_for_other_providers(self, _mock_provider, monkeypatch):
+        monkeypatch.setenv("EXTRACT_MODE", "batch_api")
+        results = extract_failures_batch([[_seg(0, 5, "crash")]])
+        assert len(results) == 1 and len(results[0]) == 1
+
+    def test_empty(self, _mock_provider):
+        assert extract_failures_batch([]) == []
+
+    def test_packs_windows_per_call(self, monkeypatch):
+        import stages.extract as extract_mod
+
+        monkeypatch.delenv("MOCK_MODE", raising=False)
+        monkeypatch.setenv("EXTRACT_PROVIDER", "openai")
+        monkeypatch.setenv("KADO_WINDOWS_PER_CALL", "2")
+        groups = []
+
+        async def fake_multi(windows):
+            groups.append(len(windows))
+            return [[] for _ in windows]
+
+        monkeypatch.setattr(extract_mod, "_extract_openai_multi_async", fake_multi)
+        windows = [[_seg(i * 40, i * 40 + 5, "error")] for i in range(5)]
+        assert extract_failures_batch(windows) == [[]] * 5
+        assert sorted(groups) == [1, 2, 2]
+
+
+    def test_group_fallback_respects_concurrency(self, monkeypatch):
+        import stages.extract as extract_mod
+
+        monkeypatch.delenv("MOCK_MODE", raising=False)
+        monkeypatch.setenv("EXTRACT_PROVIDER", "openai")
+        monkeypatch.setenv("KADO_WINDOWS_PER_CALL", "2")
+        in_flight, peak = 0, 0
+
+        async def unusable_multi(windows):
+            return None
+
+        async def fake_extract(window):
+            nonlocal in_flight, peak
+            in_flight += 1
+            peak = max(peak, in_flight)
+            await asyncio.sleep(0)
+            in_flight -= 1
+            return [window[0].start]
+
+        monkeypatch.setattr(extract_mod, "_extract_openai_multi_async", unusable_multi)
+        monkeypatch.setattr(extract_mod, "aextract_failures", fake_extract)
+        windows = [[_seg(i * 40, i * 40 + 5, "error")] for i in range(4)]
+        assert extract_failures_batch(windows, concurrency=1) == [[0], [40], [80], [120]]
+        assert peak == 1
+
+
+class TestParseFailures:
+    REPLY = '[{"timestamp_seconds": 12.5, "title": "Save fails", "expected": "saved", "actual": "error", "evidence": "it errors", "confidence": 0.9}]'
+
+    def test_plain_array(self):
+        assert _parse_failures(self.REPLY)[0].title == "Save fails"
+
+    def test_strips_markdown_fence(self):
+        assert len(_parse_failures(f"```json\n{self.REPLY}\n```")) == 1
+        assert len(_parse_failures(f"```\n{self.REPLY}\n```")) == 1
+
+    def test_rejects_non_array(self):
+        with pytest.raises(ValueError):
+            _parse_failures('{"title": "x"}')
+        with pytest.raises(ValueError):
+            _parse_failures("not json")
+
+
+class TestTokenBucket:
+    def test_waits_grow_once_burst_is_spent(self):
+        bucket = _TokenBucket(per_minute=600, burst=1)
+        waits = [bucket._reserve() for _ in range(3)]
+        assert waits[0] == 0.0
+        assert 0.09 < waits[1] <= 0.1
+        assert 0.19 < waits[2] <= 0.2
+
+
+class TestMultiWindow:
+    def test_windows_per_call_capped_by_output_limit(self, monkeypatch):
+        import stages.extract as extract_mod
+
+        monkeypatch.setenv("KADO_WINDOWS_PER_CALL", "20")
+        group_size = extract_mod._windows_per_call()
+        assert group_size * extract_mod.WINDOW_MAX_TOKENS <= extract_mod.OPENAI_MAX_COMPLETION_TOKENS
+
+    def test_format_windows_multi(self):
+        text = _format_windows_multi([[_seg(0, 5, "one")], [_seg(5, 10, "two")]])
+        assert text == "--- WINDOW 1 ---\n[0.0s - 5.0s] one\n\n--- WINDOW 2 ---\n[5.0s - 10.0s] two"
+
+    def test_parse_failures_multi(self):
+        reply = f"[{TestParseFailures.REPLY}, []]"
+        result = _parse_failures_multi(reply, 2)
+        assert [len(r) for r in result] == [1, 0]
+
+    def test_parse_failures_multi_wrong_count(self):
+        with pytest.raises(ValueError):
+            _parse_failures_multi("[[]]", 2)
+
+
+class TestExtractOpenAI:
+    def test_uses_injected_client(self):
+        client = _fake_client([TestParseFailures.REPLY])
+        result = _extract_openai([_seg(10, 15, "it errors")], client=client)
+        assert [f.title for f in result] == ["Save fails"]
+        assert len(client.chat.completions.calls) == 1
+
+    def test_repairs_invalid_json_once(self):
+        client = _fake_client(["Sure! Here you go", TestParseFailures.REPLY])
+        result = _extract_openai([_seg(10, 15, "it errors")], client=client)
+        assert len(result) == 1
+        assert len(client.chat.completions.calls) == 2
+
+    def test_rate_limits_every_request(self, monkeypatch):
+        import stages.extract as extract_mod
+
+        acquired = []
+        limiter = SimpleNamespace(acquire=lambda: acquired.append(1))
+        monkeypatch.setattr(extract_mod, "_rate_limiter", lambda: limiter)
+        client = _fake_client(["Sure! Here you go", TestParseFailures.REPLY])
+        _extract_openai([_seg(10, 15, "it errors")], client=client)
+        assert len(acquired) == len(client.chat.completions.calls) == 2
+
+    def test_gives_up_after_repair(self):
+        client = _fake_client(["nope", "still nope"])
+        assert _extract_openai([_seg(10, 15, "it errors")], client=client) == []
+
+    def test_async_repairs_invalid_json_once(self):
+        client = _fake_async_client(["Sure! Here you go", TestParseFailures.REPLY])
+        result = asyncio.run(_extract_openai_async([_seg(10, 15, "it errors")], client=client))
+        assert len(result) == 1
+        calls = client.chat.completions.calls
+        assert [c["temperature"] for c in calls] == [0.1, 0.0]
+        assert calls[1]["messages"][-1]["role"] == "user"
+
+    def test_non_object_items_count_as_invalid(self):
+        client = _fake_client(["[1, 2]", "[]"])
+        assert _extract_openai([_seg(10, 15, "it errors")], client=client) == []
+        assert len(client.chat.completions.calls) == 2
+
+
+class TestGeminiAttempts:
+    def test_repair_prompt_follows_unusable_reply(self):
+        prompts = []
+        replies = ["", TestParseFailures.REPLY]
+
+        def send(prompt: str) -> str:
+            prompts.append(prompt)
+            return replies.pop(0)
+
+        result = _converse(_gemini_attempts("[10.0s - 15.0s] it errors"), send)
+        assert len(result) == 1
+        assert prompts[1].startswith(prompts[0])
+        assert "not valid JSON" in prompts[1]
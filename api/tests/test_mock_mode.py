@@ -5,56 +5,41 @@ import os
 
 sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
 
-import pytest
-from fastapi.testclient import TestClient
+# OPENAI_API_KEY and MOCK_MODE unset
+NO_KEYS = {"OPENAI_API_KEY": None, "MOCK_MODE": None}
 
+MOCK_MODE = {"MOCK_MODE": "1", "OPENAI_API_KEY": None}
 
-@pytest.fixture
-def _no_keys(monkeypatch):
-    """Ensure OPENAI_API_KEY and MOCK_MODE are unset."""
-    monkeypatch.delenv("OPENAI_API_KEY", raising=False)
-    monkeypatch.delenv("MOCK_MODE", raising=False)
-
-
-@pytest.fixture
-def _mock_mode(monkeypatch):
-    """Enable mock mode."""
-    monkeypatch.setenv("MOCK_MODE", "1")
-    monkeypatch.delenv("OPENAI_API_KEY", raising=False)
-
-
-def _client():
-    # Re-import to pick up env changes
-    import importlib
-    import main as main_mod
-    importlib.reload(main_mod)
-    return TestClient(main_mod.app)
+# Batch API extraction is offline-only
+BATCH_API_MODE = {
+    "MOCK_MODE": None,
+    "OPENAI_API_KEY": "sk-test",
+    "EXTRACT_PROVIDER": "openai",
+    "EXTRACT_MODE": "batch_api",
+}
 
 
 class TestMissingApiKey:
-    def test_analyze_returns_501_without_key(self, _no_keys):
+    def test_analyze_returns_501_without_key(self, analyze_direct):
         """POST /analyze should return 501 JSON error when OPENAI_API_KEY is missing."""
-        client = _client()
-        dummy = b"fake video content"
-        resp = client.post(
-            "/analyze",
-            files={"file": ("test.mp4", dummy, "video/mp4")},
-        )
-        assert resp.status_code == 501
-        body = resp.json()
+        status, body = analyze_direct(NO_KEYS)
+        assert status == 501
         assert "detail" in body
         assert "OPENAI_API_KEY" in body["detail"]
 
+    def test_analyze_rejects_batch_api_mode(self, analyze_direct):
+        """EXTRACT_MODE=batch_api can take hours, so /analyze refuses it up front."""
+        status, body = analyze_direct(BATCH_API_MODE)
+        assert status == 501
+        assert "EXTRACT_MODE=batch_api" in body["detail"]
+
 
 class TestMockMode:
-    def test_analyze_works_in_mock_mode(self, _mock_mode):
+    def test_analyze_works_in_mock_mode(self, app_factory, upload_request):
         """POST /analyze should return valid JSON in MOCK_MODE without any API key."""
-        client = _client()
-        dummy = b"fake video content"
-        resp = client.post(
-            "/analyze",
-            files={"file": ("test.mp4", dummy, "video/mp4")},
-        )
+        client = app_factory(MOCK_MODE)
+        payload, headers = upload_request
+        resp = client.post("/analyze", content=payload, headers=headers)
         assert resp.status_code == 200
         body = resp.json()
         assert "failures" in body
@@ -6,55 +6,49 @@ import os
 sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
 
 import pytest
-from fastapi.testclient import TestClient
+
+from models import TranscriptSegment
+
+# Real mode with local transcription and mock extraction; no OpenAI key needed
+REAL_MODE_LOCAL = {
+    "MOCK_MODE": None,
+    "TRANSCRIBE_PROVIDER": "local",
+    "EXTRACT_PROVIDER": "mock",
+    "OPENAI_API_KEY": None,
+}
+
+
+async def mock_extract_audio(video_path: str, max_duration=None) -> bytes:
+    return b"RIFF"
+
+
+def mock_transcribe_local(audio: bytes):
+    return [
+        TranscriptSegment(start=0.0, end=2.0, text="Let me show you this feature"),
+        TranscriptSegment(start=2.0, end=5.0, text="When I click here it doesn't work"),
+        TranscriptSegment(start=5.0, end=8.0, text="This is clearly a bug"),
+    ]
 
 
 @pytest.fixture
-def _real_mode_local_transcribe_mock_extract(monkeypatch):
-    """Set up real mode with local transcription and mock extraction."""
-    monkeypatch.delenv("MOCK_MODE", raising=False)
-    monkeypatch.setenv("TRANSCRIBE_PROVIDER", "local")
-    monkeypatch.setenv("EXTRACT_PROVIDER", "mock")
-    # Don't need OpenAI key since we're using local+mock
-    monkeypatch.delenv("OPENAI_API_KEY", raising=False)
-
-
-def _client(monkeypatch):
-    """Create a fresh test client with reloaded modules."""
-    import importlib
-    import main as main_mod
+def _stub_audio_and_whisper(monkeypatch):
+    """Replace ffmpeg extraction and faster-whisper with canned results."""
     import pipeline
-    from stages import audio, transcribe
-    from models import TranscriptSegment
-    
-    # Apply mocks before reload
-    def mock_get_video_duration(path: str) -> float:
-        return 10.0
-    
-    def mock_extract_audio(video_path: str) -> str:
-        return "/tmp/mock_audio.wav"
-    
-    def mock_transcribe_local(wav_path: str):
-        return [
-            TranscriptSegment(start=0.0, end=2.0, text="Let me show you this feature"),
-            TranscriptSegment(start=2.0, end=5.0, text="When I click here it doesn't work"),
-            TranscriptSegment(start=5.0, end=8.0, text="This is clearly a bug"),
-        ]
-    
-    # Patch at module level where they're imported
-    monkeypatch.setattr("stages.audio.extract_audio", mock_extract_audio)
-    monkeypatch.setattr("stages.transcribe._transcribe_local", mock_transcribe_local)
-    
-    importlib.reload(pipeline)
-    importlib.reload(main_mod)
-    
-    monkeypatch.setattr(main_mod, "_get_video_duration", mock_get_video_duration)
-    
-    return TestClient(main_mod.app)
+    from stages import transcribe
+
+    # pipeline binds extract_audio at import, so patch the name it calls
+    monkeypatch.setattr(pipeline, "extract_audio", mock_extract_audio)
+    monkeypatch.setattr(transcribe, "_transcribe_local", mock_transcribe_local)
+
+
+@pytest.fixture
+def real_client(app_factory, _stub_audio_and_whisper):
+    """Client in real mode with ffmpeg and faster-whisper stubbed out."""
+    return app_factory(REAL_MODE_LOCAL)
 
 
 class TestRealModeLocalTranscription:
-    def test_analyze_returns_200_with_mode_real(self, _real_mode_local_transcribe_mock_extract, monkeypatch):
+    def test_analyze_returns_200_with_mode_real(self, _stub_audio_and_whisper, analyze_direct):
         """POST /analyze should return 200 with mode='real' when using local transcription + mock extraction.
         
         This test verifies that:
@@ -63,23 +57,10 @@ class TestRealModeLocalTranscription:
         - Mock extraction provider provides fast, deterministic results
         - Response correctly indicates mode='real'
         """
-        client = _client(monkeypatch)
-        
-        # Create a minimal valid video file (empty is fine for this test since
-        # local transcription will be used, which we're assuming is installed)
-        # Note: In reality, faster-whisper needs a valid audio file, but the test
-        # framework should handle this or we'd need a fixture video
-        dummy = b"fake video content"
-        
-        resp = client.post(
-            "/analyze",
-            files={"file": ("test.mp4", dummy, "video/mp4")},
-        )
+        status, body = analyze_direct(REAL_MODE_LOCAL)
         
         # Should succeed with local transcription + mock extraction
-        assert resp.status_code == 200, f"Expected 200, got {resp.status_code}: {resp.text}"
-        
-        body = resp.json()
+        assert status == 200, f"Expected 200, got {status}: {body}"
         
         # Verify response structure
         assert "failures" in body
@@ -100,3 +81,51 @@ class TestRealModeLocalTranscription:
             assert "evidence" in f
             assert "confidence" in f
             assert 0 <= f["confidence"] <= 1
+
+    def test_if_none_match_returns_304_for_cached_result(self, real_client, monkeypatch, upload_request):
+        """A repeat upload sending back the ETag should get 304 once the result is cached."""
+        client = real_client
+        import main as main_mod
+        from cache import ResultCache
+        cache = ResultCache(max_size=4)
+        monkeypatch.setattr(main_mod, "get_result_cache", lambda: cache)
+
+        payload, headers = upload_request
+        resp = client.post("/analyze", content=payload, headers=headers)
+        assert resp.status_code == 200
+        etag = resp.headers["etag"]
+
+        resp = client.post("/analyze", content=payload, headers={**headers, "If-None-Match": etag})
+        assert resp.status_code == 304
+        assert resp.headers["etag"] == etag
+
+    def test_undecodable_upload_returns_400(self, _stub_audio_and_whisper, analyze_direct, monkeypatch):
+        """An upload ffmpeg cannot decode is a client error, not a 500."""
+        import pipeline
+        from stages.audio import InvalidVideoError
+
+        async def failing_extract_audio(video_path: str, max_duration=None) -> bytes:
+            raise InvalidVideoError("ffmpeg failed: moov atom not found")
+
+        monkeypatch.setattr(pipeline, "extract_audio", failing_extract_audio)
+        status, body = analyze_direct(REAL_MODE_LOCAL, content=os.urandom(4096))
+
+        assert status == 400
+        assert "Cannot read video" in body["detail"]
+
+    def test_etag_covers_upload_ffmpeg_did_not_read(self, real_client, monkeypatch):
+        """A streamed upload is hashed to its end even if ffmpeg stops early."""
+        import hashlib
+
+        import main as main_mod
+
+        async def read_first_chunk(chunks, ext, max_duration=None):
+            async for _ in chunks:
+                break
+            return b"RIFF"
+
+        monkeypatch.setattr(main_mod, "extract_audio_from_stream", read_first_chunk)
+        content = os.urandom(3 * main_mod.UPLOAD_CHUNK_SIZE)
+        resp = real_client.post("/analyze", files={"file": ("clip.webm", content, "video/webm")})
+        assert resp.status_code == 200
+        assert resp.headers["etag"] == f'"{hashlib.sha256(content).hexdigest()}"'
@@ -0,0 +1,81 @@
+"""Tests for the transcription stage."""
+
+import sys
+import os
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+import struct
+from types import SimpleNamespace
+
+import pytest
+
+import stages.transcribe as transcribe_mod
+from stages.audio import WAV_BYTES_PER_SECOND
+from stages.transcribe import _split_wav, _transcribe_openai_chunk, _wav_header
+
+
+def _wav(pcm: bytes) -> bytes:
+    return _wav_header(len(pcm)) + pcm
+
+
+def _tone(seconds: float) -> bytes:
+    samples = int(seconds * WAV_BYTES_PER_SECOND // 2)
+    return struct.pack(f"<{samples}h", *([8000, -8000] * (samples // 2)))
+
+
+def _silence(seconds: float) -> bytes:
+    return bytes(int(seconds * WAV_BYTES_PER_SECOND))
+
+
+class TestSplitWav:
+    def test_short_audio_is_one_chunk(self):
+        audio = _wav(_tone(5))
+        assert _split_wav(audio, chunk_seconds=10) == [(0.0, audio)]
+
+    def test_cuts_at_silence_near_boundary(self):
+        audio = _wav(_tone(11) + _silence(0.2) + _tone(11))
+        chunks = _split_wav(audio, chunk_seconds=10)
+        assert len(chunks) == 2
+        assert chunks[0][0] == 0.0
+        assert 11.0 <= chunks[1][0] <= 11.2
+
+    def test_pieces_are_valid_wavs_covering_all_audio(self):
+        pcm = _tone(25)
+        chunks = _split_wav(_wav(pcm), chunk_seconds=10)
+        total = 0
+        for _, piece in chunks:
+            assert piece[:4] == b"RIFF"
+            data_size = struct.unpack_from("<I", piece, 40)[0]
+            assert data_size == len(piece) - 44
+            total += data_size
+        assert total == len(pcm)
+
+
+class TestTranscribeChunkSeconds:
+    def test_whole_file_by_default(self, monkeypatch):
+        monkeypatch.delenv("KADO_TRANSCRIBE_CHUNK_SECONDS", raising=False)
+        assert transcribe_mod._transcribe_chunk_seconds(10 * 1000 * 1000) == 0
+
+    def test_split_when_over_api_limit(self, monkeypatch):
+        monkeypatch.delenv("KADO_TRANSCRIBE_CHUNK_SECONDS", raising=False)
+        chunk_seconds = transcribe_mod._transcribe_chunk_seconds(transcribe_mod.WHISPER_API_MAX_BYTES + 1)
+        longest = 44 + (chunk_seconds + 2 * transcribe_mod._SPLIT_SEARCH_SECONDS) * WAV_BYTES_PER_SECOND
+        assert 0 < longest <= transcribe_mod.WHISPER_API_MAX_BYTES
+
+    def test_opt_in(self, monkeypatch):
+        monkeypatch.setenv("KADO_TRANSCRIBE_CHUNK_SECONDS", "120")
+        assert transcribe_mod._transcribe_chunk_seconds(1000) == 120
+
+
+class TestTranscribeOpenAIChunk:
+    @pytest.mark.parametrize("as_dict", [True, False])
+    def test_segments_offset_and_stripped(self, monkeypatch, as_dict):
+        raw = [{"start": 0.0, "end": 2.0, "text": " hello "}, {"start": 2.0, "end": 4.5, "text": "world"}]
+        segments = raw if as_dict else [SimpleNamespace(**seg) for seg in raw]
+        create = lambda **kwargs: SimpleNamespace(segments=segments)
+        client = SimpleNamespace(audio=SimpleNamespace(transcriptions=SimpleNamespace(create=create)))
+        monkeypatch.setattr(transcribe_mod, "get_openai_client", lambda: client)
+
+        result = _transcribe_openai_chunk(b"RIFF", offset=10.0)
+        assert [(s.start, s.end, s.text) for s in result] == [(10.0, 12.0, "hello"), (12.0, 14.5, "world")]
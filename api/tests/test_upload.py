@@ -0,0 +1,102 @@
+"""Tests for copying uploads to a temp file."""
+
+import asyncio
+import errno
+import hashlib
+import sys
+import os
+import subprocess
+import tempfile
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+import pytest
+from fastapi import UploadFile
+
+import main as main_mod
+
+
+def _spooled_upload(content: bytes) -> UploadFile:
+    """An upload large enough that Starlette has rolled it over to disk."""
+    spool = tempfile.SpooledTemporaryFile(max_size=1024)
+    spool.write(content)
+    spool.seek(0)
+    return UploadFile(file=spool, filename="big.mov")
+
+
+def _save(file: UploadFile) -> tuple[bytes, str]:
+    """Run _save_upload the way /analyze does; returns (saved bytes, sha256)."""
+
+    async def run():
+        digest = hashlib.sha256()
+        head = await file.read(main_mod.UPLOAD_CHUNK_SIZE)
+        return await main_mod._save_upload(file, ".mov", head, digest), digest.hexdigest()
+
+    path, etag = asyncio.run(run())
+    try:
+        with open(path, "rb") as f:
+            return f.read(), etag
+    finally:
+        os.unlink(path)
+
+
+@pytest.fixture
+def content() -> bytes:
+    # Spans several chunks and ends mid-chunk
+    return os.urandom(main_mod.UPLOAD_CHUNK_SIZE * 2 + 12345)
+
+
+class TestSaveUpload:
+    @pytest.mark.parametrize("explicit", [True, False])
+    def test_upload_spool_follows_explicit_kado_tmpdir(self, tmp_path, explicit):
+        env = {k: v for k, v in os.environ.items() if k not in ("KADO_TMPDIR", "TMPDIR")}
+        env["TMPDIR"] = str(tmp_path / "system")
+        (tmp_path / "system").mkdir()
+        if explicit:
+            env["KADO_TMPDIR"] = str(tmp_path)
+        out = subprocess.run(
+            [sys.executable, "-c", "import main, tempfile; print(tempfile.gettempdir())"],
+            cwd=os.path.join(os.path.dirname(__file__), ".."),
+            env=env, capture_output=True, text=True, check=True,
+        ).stdout
+        assert out.strip() == str(tmp_path if explicit else tmp_path / "system")
+
+    def test_spooled_upload_is_copied_whole(self, content):
+        upload = _spooled_upload(content)
+        assert main_mod._spooled_fd(upload) is not None
+
+        saved, etag = _save(upload)
+        assert saved == content
+        assert etag == hashlib.sha256(content).hexdigest()
+
+    def test_falls_back_when_sendfile_needs_a_socket(self, content, monkeypatch):
+        def sendfile(*args):
+            raise OSError(errno.ENOTSOCK, "Socket operation on non-socket")
+
+        monkeypatch.setattr(os, "sendfile", sendfile, raising=False)
+        saved, etag = _save(_spooled_upload(content))
+        assert saved == content
+        assert etag == hashlib.sha256(content).hexdigest()
+
+    def test_short_reads_still_hash_everything(self, content, monkeypatch):
+        preadv = os.preadv
+
+        def short_preadv(fd, buffers, offset):
+            # Never fill more than 1000 bytes per call
+            return preadv(fd, [buffers[0][:1000]], offset)
+
+        monkeypatch.setattr(os, "preadv", short_preadv)
+        saved, etag = _save(_spooled_upload(content))
+        assert saved == content
+        assert etag == hashlib.sha256(content).hexdigest()
+
+    def test_in_memory_upload(self):
+        content = b"small upload"
+        upload = UploadFile(file=tempfile.SpooledTemporaryFile(max_size=1 << 20), filename="small.mov")
+        upload.file.write(content)
+        upload.file.seek(0)
+        assert main_mod._spooled_fd(upload) is None
+
+        saved, etag = _save(upload)
+        assert saved == content
+        assert etag == hashlib.sha256(content).hexdigest()